@@ -1,21 +1,30 @@
+from dotenv import load_dotenv
+
+# Antes de tudo: LOG_LEVEL, CHATBOT_API_URL e as variáveis lidas pelos módulos
+# de src/ podem vir do .env
+load_dotenv()
+
 import streamlit as st
-from src.graph import app_graph
-from langchain_core.messages import HumanMessage, AIMessage
-import pandas as pd
-
-def get_message_text(message):
-    if isinstance(message.content, str):
-        return message.content
-    elif isinstance(message.content, list):
-        # Trata lista de blocos (ex: [{'type': 'text', 'text': '...'}])
-        text_parts = []
-        for part in message.content:
-            if isinstance(part, dict) and 'text' in part:
-                text_parts.append(part['text'])
-            elif isinstance(part, str):
-                text_parts.append(part)
-        return "".join(text_parts)
-    return str(message.content)
+import json
+import logging
+import os
+import time
+from src.conversation import ServerBusy, get_chat
+from src.sessions import RESUME_COOKIE, new_thread_id, resume_token, thread_from_resume_token
+from src.utils import get_storage
+
+# Decisões do roteador e demais logs de depuração: LOG_LEVEL=DEBUG
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "WARNING"))
+
+SOLICITACOES_VIEW_LIMIT = 200
+
+# Retomada da conversa após recarregar a página: sem SESSION_SECRET, desativada
+SESSION_SECRET = os.getenv("SESSION_SECRET")
+SESSION_RESUME_TTL = int(os.getenv("SESSION_RESUME_TTL", 1800))
+
+# Com CHATBOT_API_URL definida, os turnos rodam no servidor (src/server.py);
+# sem ela, o grafo é executado neste processo
+chat = st.cache_resource(get_chat)()
 
 st.set_page_config(page_title="Banco Ágil - Atendimento Inteligente", page_icon="🏦")
 
@@ -26,64 +35,149 @@ with st.sidebar:
     st.header("Debug / Info")
     if st.checkbox("Mostrar Dados dos Clientes"):
         try:
-            df = pd.read_csv("data/clientes.csv")
+            df = get_storage().list_clientes()
             st.dataframe(df)
         except:
             st.error("Arquivo de clientes não encontrado.")
             
     if st.checkbox("Mostrar Solicitações"):
         try:
-            df = pd.read_csv("data/solicitacoes_aumento_limite.csv")
+            # Apenas as mais recentes: o log de auditoria lê só os segmentos necessários
+            df = get_storage().list_solicitacoes(limit=SOLICITACOES_VIEW_LIMIT)
             st.dataframe(df)
         except:
             st.write("Nenhuma solicitação ainda.")
 
-# Inicializa o estado da sessão
-if "messages" not in st.session_state:
-    st.session_state.messages = []
-    
-if "graph_state" not in st.session_state:
-    st.session_state.graph_state = {"messages": [], "authenticated": False, "current_agent": "triagem"}
+    if st.checkbox("Mostrar Fast-path"):
+        stats = chat.metrics()["fast_path"]
+        st.metric("Taxa de acerto", f"{stats['hit_rate']:.0%}", help=f"{stats['hits']} de {stats['turns']} turnos sem LLM")
+        st.metric("Latência economizada (estimada)", f"{stats['est_saved_ms'] / 1000:.1f} s")
+        st.caption(f"Fast-path médio: {stats['avg_fast_ms']:.1f} ms | Chamada LLM média: {stats['avg_llm_ms']:.0f} ms")
+
+    if st.checkbox("Mostrar Cache de Respostas"):
+        stats = chat.metrics()["response_cache"]
+        st.metric("Taxa de acerto", f"{stats['hit_rate']:.0%}", help=f"{stats['hits']} de {stats['lookups']} perguntas sem LLM ({stats['semantic_hits']} por similaridade)")
+        st.metric("Latência economizada (estimada)", f"{stats['est_saved_ms'] / 1000:.1f} s")
+        st.caption(f"Consulta média: {stats['avg_lookup_ms']:.2f} ms | Respostas em cache: {stats['entries']}")
+
+    if st.checkbox("Mostrar Contexto"):
+        rows = chat.metrics()["context"]
+        if rows:
+            # Tokens de prompt e latência por chamada em função do tamanho do histórico
+            st.line_chart(rows, x="history_len", y=["est_tokens", "prompt_tokens"])
+            st.line_chart(rows, x="history_len", y="latency_ms")
+            st.dataframe(rows)
+        else:
+            st.write("Nenhuma chamada ao LLM ainda.")
+
+    if st.checkbox("Mostrar Tracing"):
+        snapshot = chat.metrics()
+        if snapshot["histograms"]:
+            # Percentis por tipo de span: roteador, chamadas ao LLM, ferramentas e armazenamento
+            st.dataframe(snapshot["histograms"], hide_index=True)
+            st.json(snapshot["counters"], expanded=False)
+            last = snapshot["last_trace"]
+            # Spans de armazenamento fora de um turno (ex: painéis acima) não geram trace
+            if last is not None:
+                st.caption(f"Último turno ({last['id']}): {len(last['rows'])} spans")
+                st.dataframe(
+                    [{**row, "span": "  " * row["depth"] + row["span"]} for row in last["rows"]],
+                    hide_index=True,
+                )
+        else:
+            st.write("Nenhum span registrado ainda.")
 
-# Exibe mensagens do chat
-for message in st.session_state.messages:
+# Inicializa a sessão: o estado da conversa fica no checkpointer do grafo,
+# identificado pelo thread_id. O id nunca vai na URL (quem tivesse o link
+# retomaria uma sessão já autenticada): fica na sessão do navegador e num
+# cookie assinado e de curta duração, lido ao recarregar a página
+if "thread_id" not in st.session_state:
+    resumed = SESSION_SECRET and thread_from_resume_token(st.context.cookies.get(RESUME_COOKIE), SESSION_SECRET)
+    st.session_state.thread_id = resumed or new_thread_id()
+if "sessao" in st.query_params:
+    del st.query_params["sessao"]  # Links antigos: o id recebido é ignorado
+
+with st.sidebar:
+    streaming = st.toggle("Streaming de respostas", value=True)
+    if st.button("Nova conversa"):
+        st.session_state.thread_id = new_thread_id()
+        st.rerun()
+
+def set_resume_cookie():
+    """Grava o cookie de retomada, renovado na metade da validade (expira sem uso)."""
+    issued = st.session_state.get("resume_cookie")
+    now = time.time()
+    if issued and issued[0] == st.session_state.thread_id and now - issued[1] < SESSION_RESUME_TTL / 2:
+        return
+    token = resume_token(st.session_state.thread_id, SESSION_SECRET, SESSION_RESUME_TTL, now)
+    # O Streamlit não define cabeçalhos de resposta, então o cookie não pode ser
+    # HttpOnly; a assinatura, a validade curta e o SameSite=Strict limitam o uso
+    cookie = f"{RESUME_COOKIE}={token}; Max-Age={SESSION_RESUME_TTL}; Path=/; SameSite=Strict"
+    st.html(
+        f"<script>document.cookie = {json.dumps(cookie)}"
+        " + (location.protocol === 'https:' ? '; Secure' : '');</script>",
+        unsafe_allow_javascript=True,
+    )
+    st.session_state.resume_cookie = (st.session_state.thread_id, now)
+
+if SESSION_SECRET:
+    set_resume_cookie()
+
+# Exibe mensagens do chat a partir do estado persistido
+for message in chat.history(st.session_state.thread_id):
     with st.chat_message(message["role"]):
         st.markdown(message["content"])
 
 # Entrada do chat
 if prompt := st.chat_input("Digite sua mensagem..."):
-    # Adiciona mensagem do usuário à UI
-    st.session_state.messages.append({"role": "user", "content": prompt})
     with st.chat_message("user"):
         st.markdown(prompt)
 
-    # Adiciona ao estado do grafo
-    st.session_state.graph_state['messages'].append(HumanMessage(content=prompt))
-    
-    # Executa o grafo
-    with st.spinner("Processando..."):
-        # Precisamos executar o grafo até que ele pare no FIM
-        # O compile() retorna um Runnable
-        
-        # Nota: O estado do LangGraph é imutável no sentido de que o invoke retorna um novo estado
-        # Precisamos passar o histórico do estado atual
-        
-        # Idealmente usamos um checkpointer para persistência, mas para este app Streamlit simples
-        # podemos apenas passar o dicionário de estado.
-        
-        final_state = app_graph.invoke(st.session_state.graph_state)
-        
-        # Atualiza nosso estado de sessão com o novo estado
-        st.session_state.graph_state = final_state
-        
-        # Obtém a última mensagem da IA
-        last_msg = final_state['messages'][-1]
-        
-        if isinstance(last_msg, AIMessage):
-            content = get_message_text(last_msg)
-            st.session_state.messages.append({"role": "assistant", "content": content})
+    # Envia apenas a nova mensagem; o restante do estado é carregado do
+    # checkpointer pelo thread_id
+    start = time.perf_counter()
+
+    try:
+        if streaming:
             with st.chat_message("assistant"):
-                st.markdown(content)
+                status = st.status("Processando...", expanded=False)
+                placeholder = st.empty()
+                buffer = ""
+                first_token = None
+
+                for event in chat.stream(st.session_state.thread_id, prompt):
+                    if event["type"] == "token":
+                        if first_token is None:
+                            first_token = time.perf_counter() - start
+                        buffer += event["text"]
+                        placeholder.markdown(buffer + "▌")
+                    elif event["type"] == "tool_result":
+                        status.write(f"✔ {event['name'] or 'ferramenta'}")
+                    elif event["type"] == "tool_call":
+                        status.update(label=f"Executando {', '.join(event['names'])}...")
+                        # Texto emitido antes da chamada de ferramenta é substituído pela resposta final
+                        buffer = ""
+                        placeholder.empty()
+                    elif event["type"] == "done" and not buffer:
+                        buffer = event["reply"]
+
+                total = time.perf_counter() - start
+                status.update(label="Concluído", state="complete")
+                placeholder.markdown(buffer)
+                ttft = f"{first_token:.2f} s" if first_token is not None else "-"
+                st.caption(f"Primeiro token: {ttft} | Turno: {total:.2f} s")
+        else:
+            with st.spinner("Processando..."):
+                content = chat.send(st.session_state.thread_id, prompt)
+                total = time.perf_counter() - start
+
+                if content:
+                    with st.chat_message("assistant"):
+                        st.markdown(content)
+                        st.caption(f"Turno: {total:.2f} s")
+    except ServerBusy as error:
+        wait = f" Tente novamente em {error.retry_after:.0f} s." if error.retry_after else ""
+        st.warning(f"O atendimento está sobrecarregado no momento.{wait}")
 
 # Informações de ajuda
 st.markdown("---")
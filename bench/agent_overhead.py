@@ -0,0 +1,59 @@
+"""Perfil do custo por turno antes da chamada de rede ao Gemini.
+
+Compara o caminho antigo (bind_tools + prompt em dict a cada chamada) com o
+registro de agentes pré-montados (AGENTS), incluindo a montagem da requisição
+gRPC feita pelo ChatGoogleGenerativeAI. Nenhuma requisição é enviada.
+
+Uso: python -m bench.agent_overhead [--iterations 2000] [--history 20]
+"""
+import argparse
+import os
+import time
+
+os.environ.setdefault("GOOGLE_API_KEY", "stub")
+
+from langchain_core.messages import AIMessage, HumanMessage
+from src.agents import AGENTS, llm
+
+def build_history(size):
+    messages = []
+    for i in range(size // 2):
+        messages.append(HumanMessage(content=f"Mensagem {i} do cliente sobre o limite de crédito"))
+        messages.append(AIMessage(content=f"Resposta {i} do assistente. Posso ajudar com mais alguma coisa?"))
+    return messages
+
+def per_call_bind(spec, history):
+    runnable = llm.bind_tools(spec.tools)
+    messages = [{"role": "system", "content": spec.prompt}] + history
+    return runnable, messages
+
+def prebound(spec, history):
+    return spec.request(history)
+
+def prepare_request(runnable, messages):
+    # Mesma conversão que o modelo faz antes de enviar (mensagens e ferramentas -> proto)
+    return llm._prepare_request(llm._convert_input(messages).to_messages(), **runnable.kwargs)
+
+def measure(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--history", type=int, default=20)
+    args = parser.parse_args()
+
+    history = build_history(args.history)
+    print(f"{'agente':<12} {'bind/turno (µs)':>16} {'pré-montado (µs)':>17} {'+ requisição (µs)':>18} {'+ requisição pré (µs)':>22}")
+    for name, spec in AGENTS.items():
+        old = measure(lambda: per_call_bind(spec, history), args.iterations)
+        new = measure(lambda: prebound(spec, history), args.iterations)
+        old_full = measure(lambda: prepare_request(*per_call_bind(spec, history)), args.iterations // 4)
+        new_full = measure(lambda: prepare_request(*prebound(spec, history)), args.iterations // 4)
+        print(f"{name:<12} {old:>16.1f} {new:>17.1f} {old_full:>18.1f} {new_full:>22.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""Verificação de durabilidade do log de auditoria (src/audit.py).
+
+Cenários, cada um num diretório temporário:
+
+- encerramento: um processo enfileira linhas e termina sem chamar flush; o
+  atexit deve gravar todas;
+- queda: um processo gravando sem parar é morto com SIGKILL; a leitura deve
+  trazer só linhas completas, ao menos todas as confirmadas por flush;
+- linha rasgada: segmentos terminados no meio de uma linha são lidos sem ela;
+- gravação que falha: com OSError, flush não confirma linhas não gravadas,
+  o lote é gravado quando o disco volta (sem duplicar linhas gravadas pela
+  metade) e, se falhar até o encerramento, as linhas vão para o log de erros;
+- `read(limit=0)` não retorna linhas.
+
+Uso: python -m bench.audit_durability [--rows 2000]
+"""
+import argparse
+import logging
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+import src.audit as audit
+from src.audit import AuditLog
+
+COLUMNS = ["id", "texto"]
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD_EXIT = """
+import sys
+from src.audit import AuditLog
+log = AuditLog(sys.argv[1], ["id", "texto"], batch_size=10_000, flush_interval=60)
+for i in range(int(sys.argv[2])):
+    log.append({"id": i, "texto": "linha %d" % i})
+"""
+
+CHILD_CRASH = """
+import sys
+from src.audit import AuditLog
+log = AuditLog(sys.argv[1], ["id", "texto"], batch_size=50, flush_interval=0.01, segment_rows=500)
+i = 0
+while True:
+    log.append({"id": i, "texto": "linha, com vírgula e \\"aspas\\" %d" % i})
+    i += 1
+    if i % 200 == 0:
+        log.flush()
+        print(i, flush=True)
+"""
+
+def run_child(code, *args, **kwargs):
+    env = {**os.environ, "PYTHONPATH": ROOT}
+    return subprocess.Popen([sys.executable, "-c", code, *map(str, args)], env=env, stdout=subprocess.PIPE, text=True, **kwargs)
+
+def check_exit_flush(tmp_dir, rows):
+    directory = os.path.join(tmp_dir, "saida")
+    run_child(CHILD_EXIT, directory, rows).wait(60)
+    read = AuditLog(directory, COLUMNS).read()
+    return len(read) == rows, f"{len(read)} de {rows} linhas gravadas no encerramento"
+
+def check_crash(tmp_dir, rows):
+    directory = os.path.join(tmp_dir, "queda")
+    child = run_child(CHILD_CRASH, directory)
+    confirmed = 0
+    for line in child.stdout:
+        confirmed = int(line)
+        if confirmed >= rows:
+            break
+    child.send_signal(signal.SIGKILL)
+    child.wait()
+    read = AuditLog(directory, COLUMNS).read()
+    ids = [int(row["id"]) for row in read]
+    ok = len(read) >= confirmed and ids == list(range(len(ids)))
+    return ok, f"{len(read)} linhas completas e em ordem após SIGKILL ({confirmed} confirmadas por flush)"
+
+def check_torn_lines(tmp_dir):
+    directory = os.path.join(tmp_dir, "rasgada")
+    os.makedirs(directory)
+    with open(os.path.join(directory, "0001.csv"), "w", encoding="utf-8") as f:
+        f.write("id,texto\n1,um\n2,do")                   # Queda no meio da última linha
+    with open(os.path.join(directory, "0002.csv"), "w", encoding="utf-8") as f:
+        f.write("id,texto\n3,três\n4\n5")                # Linha sem colunas e queda logo após o id
+    read = AuditLog(directory, COLUMNS).read()
+    ids = [row["id"] for row in read]
+    return ids == ["1", "3"], f"linhas lidas: {ids}"
+
+class FailingDisk:
+    """Faz os.fsync do módulo de auditoria falhar enquanto `failing` for True (depois do write do lote)."""
+
+    def __init__(self):
+        self.failing = False
+        self.failures = 0
+        self._fsync = os.fsync
+
+    def fsync(self, fd):
+        if self.failing:
+            self.failures += 1
+            raise OSError(28, "No space left on device")
+        self._fsync(fd)
+
+def check_failed_write(tmp_dir, rows):
+    directory = os.path.join(tmp_dir, "falha")
+    log = AuditLog(directory, COLUMNS, batch_size=rows, flush_interval=0.05)
+    disk = FailingDisk()
+    log.append({"id": -1, "texto": "antes da falha"})
+    log.flush()  # Segmento aberto antes de o disco falhar
+    audit.os.fsync = disk.fsync
+    try:
+        disk.failing = True
+        for i in range(rows):
+            log.append({"id": i, "texto": f"linha {i}"})
+        confirmed_while_failing = log.flush(timeout=0.5)
+        disk.failing = False
+        confirmed = log.flush(timeout=10)
+    finally:
+        audit.os.fsync = disk._fsync
+        log.close()
+    ids = [int(row["id"]) for row in log.read()]
+    ok = not confirmed_while_failing and confirmed and disk.failures > 0 and ids == list(range(-1, rows))
+    return ok, (f"flush durante a falha: {confirmed_while_failing} | depois: {confirmed} | "
+                f"{disk.failures} falhas | {len(ids)} de {rows + 1} linhas, sem duplicatas: {len(ids) == len(set(ids))}")
+
+class Captured(logging.Handler):
+    def __init__(self):
+        super().__init__(logging.ERROR)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+def check_failed_stop(tmp_dir):
+    directory = os.path.join(tmp_dir, "falha-encerramento")
+    log = AuditLog(directory, COLUMNS, batch_size=1000, flush_interval=0.01)
+    disk = FailingDisk()
+    handler = Captured()
+    audit.logger.addHandler(handler)
+    audit.os.fsync = disk.fsync
+    try:
+        disk.failing = True
+        log.append({"id": 7, "texto": "perdida no disco"})
+        log.close(timeout=10)
+    finally:
+        audit.os.fsync = disk._fsync
+        audit.logger.removeHandler(handler)
+    reported = any("sem gravar 1 linha" in m and "perdida no disco" in m for m in handler.messages)
+    return reported, f"linha não gravada registrada no log de erros: {reported}"
+
+def check_read_limit_zero(tmp_dir):
+    directory = os.path.join(tmp_dir, "limite")
+    log = AuditLog(directory, COLUMNS)
+    log.append({"id": 1, "texto": "um"})
+    log.close()
+    read = log.read(limit=0)
+    return read == [], f"read(limit=0) -> {len(read)} linhas"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=2000)
+    args = parser.parse_args()
+    audit.logger.addHandler(logging.NullHandler())  # As falhas simuladas geram logs esperados
+    audit.logger.propagate = False
+
+    failed = 0
+    with tempfile.TemporaryDirectory(prefix="bench-audit-") as tmp_dir:
+        checks = [
+            ("encerramento", lambda: check_exit_flush(tmp_dir, args.rows)),
+            ("queda (SIGKILL)", lambda: check_crash(tmp_dir, args.rows)),
+            ("linha rasgada", lambda: check_torn_lines(tmp_dir)),
+            ("gravação que falha", lambda: check_failed_write(tmp_dir, args.rows)),
+            ("falha no encerramento", lambda: check_failed_stop(tmp_dir)),
+            ("read(limit=0)", lambda: check_read_limit_zero(tmp_dir)),
+        ]
+        for name, check in checks:
+            start = time.perf_counter()
+            ok, detail = check()
+            failed += not ok
+            print(f"{'OK   ' if ok else 'FALHA'} {name:<22} {detail} ({time.perf_counter() - start:.2f} s)")
+    if failed:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
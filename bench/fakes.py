@@ -0,0 +1,157 @@
+"""Dublês para rodar o grafo sem rede: modelo de chat roteirizado e API de câmbio local."""
+import asyncio
+import json
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from src.context import estimate_tokens, get_text
+from src.router import normalize
+
+CPF_REGEX = re.compile(r"\b\d{11}\b")
+
+def _number(value):
+    return float(value.replace(".", "").replace(",", "."))
+
+# Regras do roteiro: (ferramenta, regex sobre a mensagem normalizada do usuário, argumentos)
+# O CPF das ferramentas de crédito vem do histórico, como faria o modelo real.
+SCRIPT_RULES = [
+    ("check_auth", re.compile(r"cpf e (\d{11}) e nasci em (\d{4}-\d{2}-\d{2})"),
+     lambda m, cpf: {"cpf": m.group(1), "data_nascimento": m.group(2)}),
+    ("request_limit_increase", re.compile(r"limite para ([\d.,]+)"),
+     lambda m, cpf: {"cpf": cpf, "new_limit": _number(m.group(1))}),
+    ("get_credit_limit", re.compile(r"meu limite"),
+     lambda m, cpf: {"cpf": cpf}),
+    ("process_interview", re.compile(r"renda e ([\d.,]+), trabalho (\w+), (\d+) dependentes?, (sem|com) dividas e despesas de ([\d.,]+)"),
+     lambda m, cpf: {
+         "cpf": cpf, "renda": _number(m.group(1)), "tipo_emprego": m.group(2), "dependentes": int(m.group(3)),
+         "tem_dividas": "nao" if m.group(4) == "sem" else "sim", "despesas": _number(m.group(5)),
+     }),
+    ("get_exchange_rates", re.compile(r"converter [\d.,]+ (dolares|euros|libras)"),
+     lambda m, cpf: {"currencies": [{"dolares": "USD", "euros": "EUR", "libras": "GBP"}[m.group(1)]]}),
+    ("end_conversation", re.compile(r"encerrar"),
+     lambda m, cpf: {}),
+]
+
+class ScriptedChatModel(BaseChatModel):
+    """Modelo de chat determinístico que segue o roteiro de SCRIPT_RULES.
+
+    Numa mensagem do usuário, emite a chamada da primeira regra cuja
+    ferramenta está vinculada ao agente; depois do retorno da ferramenta,
+    responde repetindo o resultado (o que permite ao roteador seguir ofertas
+    como "Gostaria de fazer uma entrevista?"). Cada chamada espera `latency`
+    segundos e informa tokens estimados em `usage_metadata`.
+    """
+
+    latency: float = 0.0
+    rules: list = SCRIPT_RULES
+
+    @property
+    def _llm_type(self):
+        return "scripted-fake"
+
+    def bind_tools(self, tools, **kwargs):
+        return self.bind(tool_names=[t.name for t in tools], **kwargs)
+
+    def _respond(self, messages, tool_names):
+        last = messages[-1]
+        if last.type == "tool":
+            content = f"{get_text(last)}\n\nPosso ajudar com mais alguma coisa?"
+        elif last.type == "human":
+            content = "Olá! Para começar, informe seu CPF e sua data de nascimento."
+            text = normalize(get_text(last))
+            for name, regex, build_args in self.rules:
+                match = regex.search(text)
+                if match and name in tool_names:
+                    call = {"name": name, "args": build_args(match, self._find_cpf(messages)), "id": uuid.uuid4().hex}
+                    return self._message("", messages, tool_calls=[call])
+        else:
+            content = "Posso ajudar com mais alguma coisa?"
+        return self._message(content, messages)
+
+    def _find_cpf(self, messages):
+        for message in reversed(messages):
+            match = CPF_REGEX.search(get_text(message))
+            if match:
+                return match.group(0)
+        return None
+
+    def _message(self, content, messages, tool_calls=()):
+        input_tokens = sum(estimate_tokens(m) for m in messages)
+        output_tokens = len(content) // 4 + 8 * len(tool_calls)
+        return AIMessage(content=content, tool_calls=list(tool_calls), usage_metadata={
+            "input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens,
+        })
+
+    def _generate(self, messages, stop=None, run_manager=None, tool_names=(), **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._respond(messages, tool_names))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, tool_names=(), **kwargs):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._respond(messages, tool_names))])
+
+# --- API de câmbio local ---
+USD_QUOTES = {"USDBRL": 5.0, "USDEUR": 0.92, "USDGBP": 0.79, "USDJPY": 150.0, "USDARS": 900.0}
+
+class ExchangeRateStub:
+    """Servidor HTTP local que imita o endpoint /live do exchangerate.host.
+
+    Como no plano gratuito, só aceita USD como moeda base (erro 105 para as
+    demais), exercitando a derivação de pares cruzados do cliente. Conta as
+    requisições recebidas em `requests`.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.requests = 0
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with stub._lock:
+                    stub.requests += 1
+                if stub.latency:
+                    time.sleep(stub.latency)
+                query = {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+                body = json.dumps(stub.respond(query)).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+
+    @property
+    def url(self):
+        host, port = self.server.server_address
+        return f"http://{host}:{port}"
+
+    def respond(self, query):
+        if query.get("source", "USD") != "USD":
+            return {"success": False, "error": {"code": 105, "info": "Access Restricted - Your current Subscription Plan does not support Source Currency Switching."}}
+        currencies = [c for c in query.get("currencies", "").split(",") if c]
+        return {"success": True, "source": "USD", "quotes": {f"USD{c}": USD_QUOTES[f"USD{c}"] for c in currencies if f"USD{c}" in USD_QUOTES}}
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
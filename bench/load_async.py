@@ -0,0 +1,86 @@
+"""Teste de carga do caminho assíncrono (app_graph.ainvoke) com LLM simulado.
+
+Cada sessão autenticada faz alguns turnos de crédito; o LLM simulado responde
+com latência fixa (asyncio.sleep), emitindo uma chamada a get_credit_limit e
+depois o texto final. Mede turnos/s para diferentes níveis de concorrência.
+
+Uso: python -m bench.load_async [--sessions 64] [--turns 3] [--latency 0.2]
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import uuid
+
+os.environ.setdefault("GOOGLE_API_KEY", "stub")
+os.environ["CHECKPOINT_DB"] = os.path.join(tempfile.mkdtemp(), "checkpoints.sqlite")
+
+from langchain_core.messages import AIMessage, HumanMessage
+import src.graph as graph
+from src.agents import set_llm
+from src.sessions import TURN_DURABILITY, session_config
+
+CPF = "12345678900"
+
+class StubLLM:
+    """LLM simulado: chama get_credit_limit quando a última mensagem é do usuário."""
+
+    def __init__(self, latency, tool_names=()):
+        self.latency = latency
+        self.tool_names = tool_names
+
+    def bind_tools(self, tools):
+        return StubLLM(self.latency, [t.name for t in tools])
+
+    def _respond(self, messages):
+        if messages[-1].type == "human" and "get_credit_limit" in self.tool_names:
+            call = {"name": "get_credit_limit", "args": {"cpf": CPF}, "id": uuid.uuid4().hex}
+            return AIMessage(content="", tool_calls=[call])
+        return AIMessage(content="Posso ajudar com mais alguma coisa?")
+
+    def invoke(self, messages):
+        time.sleep(self.latency)
+        return self._respond(messages)
+
+    async def ainvoke(self, messages):
+        await asyncio.sleep(self.latency)
+        return self._respond(messages)
+
+async def run_session(turns):
+    config = session_config(uuid.uuid4().hex)
+    first = {"authenticated": True, "cpf": CPF, "current_agent": "credito"}
+    for i in range(turns):
+        turn = {"messages": [HumanMessage(content="quero aumentar meu limite")]}
+        if i == 0:
+            turn.update(first)
+        await graph.get_app_graph().ainvoke(turn, config, durability=TURN_DURABILITY)
+
+async def run_level(concurrency, sessions, turns):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded():
+        async with semaphore:
+            await run_session(turns)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(bounded() for _ in range(sessions)))
+    elapsed = time.perf_counter() - start
+    return sessions * turns / elapsed, elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=64)
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.2, help="Latência simulada por chamada ao LLM (s).")
+    parser.add_argument("--levels", default="1,4,16,64", help="Níveis de concorrência separados por vírgula.")
+    args = parser.parse_args()
+
+    set_llm(StubLLM(args.latency))
+    print(f"{'concorrência':>12} {'turnos/s':>10} {'tempo (s)':>10}")
+    for level in (int(x) for x in args.levels.split(",")):
+        throughput, elapsed = asyncio.run(run_level(level, args.sessions, args.turns))
+        print(f"{level:>12} {throughput:>10.1f} {elapsed:>10.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""Benchmark offline: conversas roteirizadas reproduzidas no app_graph, sem rede.
+
+O Gemini é trocado pelo ScriptedChatModel (bench/fakes.py) e a API de câmbio
+por um servidor HTTP local. Cada sessão usa um cliente próprio numa cópia
+temporária da base (CSV ou SQLite) e segue um de dois roteiros:
+
+- crédito: autenticação -> consulta de limite -> aumento rejeitado ->
+  entrevista -> nova tentativa;
+- câmbio: autenticação -> cotações (fast-path) -> conversão (LLM) -> encerramento.
+
+Relatório: turnos/s, percentis por nó/ferramenta/armazenamento (src/tracing.py),
+contagem de I/O de armazenamento e de requisições HTTP, taxas do fast-path e
+do cache de respostas e
+crescimento de memória por sessão (tracemalloc, numa rodada separada).
+
+Uso: python -m bench.replay [--sessions 200] [--concurrency 16] [--latency 0]
+                            [--backend csv|sqlite] [--memory-sessions 20] [--json saida.json]
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+import uuid
+
+TMP_DIR = tempfile.mkdtemp(prefix="bench-replay-")
+os.environ.setdefault("GOOGLE_API_KEY", "stub")
+os.environ["CHECKPOINT_DB"] = os.path.join(TMP_DIR, "checkpoints.sqlite")
+os.environ["EXCHANGERATE_API_KEY"] = "stub"
+
+from langchain_core.messages import HumanMessage
+
+from bench.fakes import ExchangeRateStub, ScriptedChatModel
+from bench.scenarios import CONVERSATIONS, build_clients
+import src.graph as graph
+from src.agents import set_llm
+from src.response_cache import response_cache
+from src.sessions import TURN_DURABILITY, session_config
+from src.tracing import metrics, turn_trace
+from src.utils import CSVStorage, SQLiteStorage, import_csv_to_sqlite, set_storage
+
+def setup_storage(backend, clients):
+    """Base temporária com um cliente por sessão (todos com o perfil do primeiro cliente de exemplo)."""
+    data_dir = os.path.join(TMP_DIR, "data")
+    cpfs = build_clients(data_dir, clients)
+    if backend == "sqlite":
+        db_path = os.path.join(TMP_DIR, "banco.sqlite")
+        import_csv_to_sqlite(db_path, data_dir)
+        set_storage(SQLiteStorage(db_path))
+    else:
+        set_storage(CSVStorage(data_dir))
+    return cpfs
+
+async def run_session(index, cpfs):
+    cpf = cpfs[index % len(cpfs)]
+    thread_id = uuid.uuid4().hex
+    config = session_config(thread_id)
+    turns = CONVERSATIONS[index % len(CONVERSATIONS)](cpf)
+    for text in turns:
+        with turn_trace(thread_id):
+            await graph.get_app_graph().ainvoke({"messages": [HumanMessage(content=text)]}, config, durability=TURN_DURABILITY)
+    return len(turns)
+
+async def run_sessions(indexes, cpfs, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded(index):
+        async with semaphore:
+            return await run_session(index, cpfs)
+
+    return sum(await asyncio.gather(*(bounded(i) for i in indexes)))
+
+def measure_memory(sessions, cpfs, offset):
+    """Memória retida por sessão (estado no checkpointer, caches, métricas), medida com tracemalloc."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    asyncio.run(run_sessions(range(offset, offset + sessions), cpfs, concurrency=1))
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / sessions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.0, help="Latência simulada por chamada ao LLM (s).")
+    parser.add_argument("--backend", choices=["csv", "sqlite"], default="csv")
+    parser.add_argument("--memory-sessions", type=int, default=20, help="Sessões da rodada de memória (0 desativa).")
+    parser.add_argument("--json", help="Grava o relatório neste arquivo (para comparar execuções).")
+    args = parser.parse_args()
+
+    stub = ExchangeRateStub().start()
+    os.environ["EXCHANGERATE_BASE_URL"] = stub.url
+    set_llm(ScriptedChatModel(latency=args.latency))
+    cpfs = setup_storage(args.backend, args.sessions + args.memory_sessions)
+    metrics.clear()  # Conta apenas o I/O das conversas, não o da preparação da base
+
+    try:
+        start = time.perf_counter()
+        turns = asyncio.run(run_sessions(range(args.sessions), cpfs, args.concurrency))
+        elapsed = time.perf_counter() - start
+        spans = metrics.histograms()
+        counters = metrics.counters()
+        fast_path = graph.fast_path_stats.snapshot()
+        cache = response_cache.snapshot(fast_path["avg_llm_ms"])
+        http_requests = stub.requests
+        memory = measure_memory(args.memory_sessions, cpfs, args.sessions) if args.memory_sessions else None
+        checkpoint_bytes = sum(os.path.getsize(os.environ["CHECKPOINT_DB"] + suffix)
+                               for suffix in ("", "-wal") if os.path.exists(os.environ["CHECKPOINT_DB"] + suffix))
+    finally:
+        stub.stop()
+        shutil.rmtree(TMP_DIR, ignore_errors=True)
+
+    report = {
+        "backend": args.backend,
+        "sessions": args.sessions,
+        "concurrency": args.concurrency,
+        "turns": turns,
+        "elapsed_s": elapsed,
+        "turns_per_s": turns / elapsed,
+        "fast_path_hit_rate": fast_path["hit_rate"],
+        "response_cache_hit_rate": cache["hit_rate"],
+        "http_requests": http_requests,
+        "storage_io": {row["span"]: row["count"] for row in spans if row["span"].startswith("storage.")},
+        "memory_per_session_kib": memory / 1024 if memory is not None else None,
+        "checkpoint_bytes_per_session": checkpoint_bytes / (args.sessions + args.memory_sessions),
+        "spans": spans,
+        "counters": counters,
+    }
+
+    print(f"backend: {args.backend} | sessões: {args.sessions} | concorrência: {args.concurrency}")
+    print(f"turnos: {turns} em {elapsed:.2f} s -> {report['turns_per_s']:.1f} turnos/s")
+    print(f"fast-path: {fast_path['hit_rate']:.0%} dos turnos | requisições HTTP de câmbio: {http_requests}")
+    print(f"cache de respostas: {cache['hits']} de {cache['lookups']} consultas ({cache['hit_rate']:.0%})")
+    if memory is not None:
+        print(f"memória retida por sessão: {report['memory_per_session_kib']:.1f} KiB")
+    print(f"checkpoint por sessão: {report['checkpoint_bytes_per_session'] / 1024:.1f} KiB")
+    print()
+    print(f"{'span':<32} {'n':>7} {'erros':>6} {'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9}")
+    for row in spans:
+        print(f"{row['span']:<32} {row['count']:>7} {row['errors']:>6} {row['p50_ms']:>9.2f} {row['p95_ms']:>9.2f} {row['p99_ms']:>9.2f}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+if __name__ == "__main__":
+    main()
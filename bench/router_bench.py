@@ -0,0 +1,158 @@
+"""Micro-benchmark do roteador de intenções (main_router + fast-path).
+
+Gera um corpus de frases de clientes (com e sem acento, respostas curtas a
+ofertas da IA) e mede o tempo por turno do roteador compilado contra a versão
+anterior, que fazia uma varredura `any(x in text ...)` por tabela. Também
+conta em quantas frases as duas versões tomam decisões diferentes (só devem
+aparecer em variações de acento que as tabelas antigas não listavam).
+
+Linhas do relatório:
+- roteador: só main_router. A versão compilada normaliza a mensagem e
+  varre todas as palavras-chave; a anterior parava no primeiro `in` que
+  casava, então aqui a compilada é mais lenta.
+- roteador + fast-path (grafo): o que o grafo faz por mensagem do usuário:
+  route_entry (roteador e fast-path) e, quando o turno vai para o fast-path,
+  o nó chama match_fast_path de novo. A versão compilada reaproveita as
+  intenções da mensagem (cache por objeto em user_intents).
+
+Uso: python -m bench.router_bench [--utterances 20000] [--repeat 3]
+"""
+import argparse
+import os
+import random
+import re
+import time
+
+os.environ.setdefault("GOOGLE_API_KEY", "stub")
+os.environ.setdefault("CHECKPOINT_DB", ":memory:")
+
+from langchain_core.messages import AIMessage, HumanMessage
+from src.graph import main_router, match_fast_path, user_intents
+
+FRASES = [
+    "Qual é a cotação do dólar hoje?", "qual a cotacao do dolar", "quanto está o euro?",
+    "quero converter 100 dólares", "me passa o câmbio da libra e do iene", "USD e EUR por favor",
+    "qual é o meu limite?", "quanto tenho de limite de credito", "quero um aumento de limite",
+    "gostaria de solicitar mais crédito", "quero fazer a entrevista", "como melhorar meu score",
+    "minha renda mudou", "sim", "pode ser", "claro, para 5000", "ok", "não, obrigado",
+    "bom dia", "quero falar com um atendente", "o que vocês fazem?", "tchau",
+    "Preciso de ajuda com minha pontuação", "isso mesmo", "com certeza!",
+]
+OFERTAS = [
+    "Posso consultar a cotação de outra moeda para você?",
+    "Seu limite atual é R$ 5.000,00. Deseja solicitar um aumento?",
+    "Podemos fazer uma entrevista para recalcular seu score. Vamos começar?",
+    "Posso ajudar com mais alguma coisa?",
+]
+AGENTES = ["triagem", "credito", "entrevista", "cambio"]
+
+def build_corpus(size, seed=42):
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(size):
+        frase = rng.choice(FRASES)
+        if rng.random() < 0.3:
+            frase = frase.upper() if rng.random() < 0.5 else f"{frase} {rng.choice(FRASES)}"
+        corpus.append({
+            "messages": [AIMessage(content=rng.choice(OFERTAS)), HumanMessage(content=frase)],
+            "cpf": "12345678901",
+            "authenticated": True,
+            "current_agent": rng.choice(AGENTES),
+        })
+    return corpus
+
+# --- Versão anterior do roteador (varreduras por tabela, sem normalização de acentos) ---
+CAMBIO_KEYWORDS = ["câmbio", "cambio", "dólar", "dolar", "moeda", "cotacao", "cotação", "euro", "converter"]
+CREDITO_KEYWORDS = ["crédito", "credito", "limite", "aumento"]
+ENTREVISTA_KEYWORDS = ["entrevista", "score", "pontuação", "pontuacao", "renda"]
+AGREEMENT_WORDS = ["sim", "claro", "quero", "pode ser", "ok", "com certeza", "gostaria", "para"]
+LIMITE_CONSULTA_WORDS = ["qual", "quanto", "consultar", "ver ", "mostrar", "meu limite"]
+LIMITE_ACAO_WORDS = ["aument", "solicit", "subir", "mudar", "alterar", "diminu", "reduz", "entrevista", "score"]
+CAMBIO_ACAO_WORDS = ["converter", "conversão", "conversao", "trocar", "comprar", "vender"]
+MOEDAS = {
+    "dólar": "USD", "dolar": "USD", "usd": "USD",
+    "euro": "EUR", "eur": "EUR",
+    "libra": "GBP", "gbp": "GBP",
+    "iene": "JPY", "jpy": "JPY",
+    "peso argentino": "ARS", "ars": "ARS",
+}
+MOEDAS_REGEX = re.compile(
+    r"\b(" + "|".join(sorted((m for m in MOEDAS if len(m) > 3), key=len, reverse=True))
+    + r"|(?:" + "|".join(m for m in MOEDAS if len(m) == 3) + r")\b)"
+)
+
+def legacy_router(state):
+    messages = state['messages']
+    text = str(messages[-1].content).lower()
+    current = state.get('current_agent', 'triagem')
+    if any(x in text for x in CAMBIO_KEYWORDS):
+        return "cambio"
+    if any(x in text for x in CREDITO_KEYWORDS):
+        return "credito"
+    if any(x in text for x in ENTREVISTA_KEYWORDS):
+        return "entrevista"
+    last_ai_text = str(messages[-2].content).lower()
+    if any(w in text for w in AGREEMENT_WORDS) or any(char.isdigit() for char in text):
+        if "câmbio" in last_ai_text or "moeda" in last_ai_text:
+            return "cambio"
+        if "entrevista" in last_ai_text or "score" in last_ai_text:
+            return "entrevista"
+        if "limite" in last_ai_text or "aumento" in last_ai_text or "r$" in last_ai_text:
+            return "credito"
+    return current
+
+def legacy_fast_path(state):
+    text = str(state['messages'][-1].content).lower()
+    if any(char.isdigit() for char in text):
+        return None
+    if any(x in text for x in CAMBIO_KEYWORDS) or MOEDAS_REGEX.search(text):
+        if any(w in text for w in CAMBIO_ACAO_WORDS):
+            return None
+        currencies = list(dict.fromkeys(MOEDAS[m.group(1)] for m in MOEDAS_REGEX.finditer(text)))
+        if currencies:
+            return "cambio", "cotacao", {"currencies": currencies}
+        return None
+    if "limite" in text and any(w in text for w in LIMITE_CONSULTA_WORDS) and not any(w in text for w in LIMITE_ACAO_WORDS):
+        return "credito", "limite", {"cpf": state['cpf']}
+    return None
+
+def legacy_entry(state):
+    agent, match = legacy_router(state), legacy_fast_path(state)
+    if match is not None and match[0] == agent:
+        legacy_fast_path(state)  # fast_path_node
+    return agent, match
+
+def compiled_entry(state):
+    intents = user_intents(state)
+    agent, match = main_router(state, intents), match_fast_path(state, intents)
+    if match is not None and match[0] == agent:
+        match_fast_path(state)  # fast_path_node
+    return agent, match
+
+def measure(fn, corpus, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for state in corpus:
+            fn(state)
+        best = min(best, time.perf_counter() - start)
+    return best / len(corpus) * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--utterances", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.utterances)
+    print(f"frases: {len(corpus)}")
+    print(f"{'':<28} {'anterior (µs)':>14} {'compilado (µs)':>15}")
+    router = (measure(legacy_router, corpus, args.repeat), measure(lambda s: main_router(s), corpus, args.repeat))
+    entry = (measure(legacy_entry, corpus, args.repeat), measure(compiled_entry, corpus, args.repeat))
+    print(f"{'roteador':<28} {router[0]:>14.2f} {router[1]:>15.2f}")
+    print(f"{'roteador + fast-path (grafo)':<28} {entry[0]:>14.2f} {entry[1]:>15.2f}")
+    divergent = sum(legacy_entry(s) != compiled_entry(s) for s in corpus)
+    print(f"decisões diferentes: {divergent} ({divergent / len(corpus):.1%})")
+
+if __name__ == "__main__":
+    main()
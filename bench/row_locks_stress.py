@@ -0,0 +1,115 @@
+"""Teste de estresse das atualizações por CPF: nenhuma atualização pode se perder.
+
+Vários processos, cada um com várias threads, incrementam o limite de clientes
+sorteados via `modify_cliente` (trava do CPF + verificação de versão). Metade
+das operações vai para poucos CPFs "quentes" (disputa pelo mesmo CPF) e o resto
+se espalha pela base (CPFs diferentes reescrevendo o mesmo arquivo, no CSV).
+No fim, o limite e a versão de cada cliente devem ter subido exatamente o
+número de incrementos feitos nele.
+
+`--unsafe` faz leitura + gravação sem trava nem versão, como antes, para
+mostrar as atualizações perdidas.
+
+Uso: python -m bench.row_locks_stress [--backend csv|sqlite] [--processes 4] [--threads 8]
+                                      [--ops 100] [--clients 50] [--hot 2] [--unsafe]
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from bench.scenarios import build_clients
+from src.tracing import metrics
+from src.utils import CSVStorage, SQLiteStorage, get_storage, import_csv_to_sqlite, modify_cliente, set_storage
+
+def open_storage(backend, tmp_dir):
+    if backend == "sqlite":
+        return SQLiteStorage(os.path.join(tmp_dir, "banco.sqlite"))
+    return CSVStorage(os.path.join(tmp_dir, "data"))
+
+def increment(cpf, unsafe):
+    if unsafe:
+        storage = get_storage()
+        user = storage.get_cliente(cpf)
+        storage.update_cliente(cpf, limite=user['limite'] + 1)
+    else:
+        modify_cliente(cpf, lambda user: {'limite': user['limite'] + 1})
+
+def worker(backend, tmp_dir, cpfs, hot, threads, ops, unsafe, seed):
+    """Um processo: `threads` threads com `ops` incrementos cada; retorna os incrementos por CPF."""
+    set_storage(open_storage(backend, tmp_dir))
+    counts = Counter()
+    lock = threading.Lock()
+
+    def run(thread_seed):
+        rng = random.Random(thread_seed)
+        local = Counter()
+        for _ in range(ops):
+            cpf = rng.choice(cpfs[:hot]) if rng.random() < 0.5 else rng.choice(cpfs)
+            increment(cpf, unsafe)
+            local[cpf] += 1
+        with lock:
+            counts.update(local)
+
+    pool = [threading.Thread(target=run, args=(seed * 1000 + i,)) for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return counts, metrics.counters().get("storage.version_conflicts", 0)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=["csv", "sqlite"], default="csv")
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--ops", type=int, default=100, help="Incrementos por thread.")
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--hot", type=int, default=2, help="CPFs disputados por todas as threads.")
+    parser.add_argument("--unsafe", action="store_true", help="Sem trava nem versão (comportamento antigo).")
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp(prefix="bench-locks-")
+    try:
+        cpfs = build_clients(os.path.join(tmp_dir, "data"), args.clients)
+        if args.backend == "sqlite":
+            import_csv_to_sqlite(os.path.join(tmp_dir, "banco.sqlite"), os.path.join(tmp_dir, "data"))
+        before = open_storage(args.backend, tmp_dir).list_clientes().set_index("cpf")
+
+        context = multiprocessing.get_context("spawn")
+        worker_args = [(args.backend, tmp_dir, cpfs, args.hot, args.threads, args.ops, args.unsafe, p)
+                       for p in range(args.processes)]
+        start = time.perf_counter()
+        with context.Pool(args.processes) as pool:
+            results = pool.starmap(worker, worker_args)
+        elapsed = time.perf_counter() - start
+
+        expected = Counter()
+        for counts, _ in results:
+            expected.update(counts)
+        conflicts = sum(c for _, c in results)
+        after = open_storage(args.backend, tmp_dir).list_clientes().set_index("cpf")
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    lost = 0
+    wrong_versions = 0
+    for cpf in cpfs:
+        lost += before.at[cpf, "limite"] + expected[cpf] - after.at[cpf, "limite"]
+        wrong_versions += after.at[cpf, "versao"] != before.at[cpf, "versao"] + expected[cpf]
+
+    total = sum(expected.values())
+    print(f"backend: {args.backend} | processos: {args.processes} x threads: {args.threads} | "
+          f"clientes: {args.clients} ({args.hot} disputados) | {'SEM trava' if args.unsafe else 'com trava'}")
+    print(f"{total} atualizações em {elapsed:.2f} s -> {total / elapsed:.0f} atualizações/s | conflitos de versão: {conflicts}")
+    print(f"atualizações perdidas: {int(lost)} | versões divergentes: {int(wrong_versions)}")
+    if lost or wrong_versions:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""Roteiros de conversa e base de clientes usados pelos benchmarks (replay e servidor)."""
+import os
+import shutil
+
+import pandas as pd
+
+from src.utils import CLIENTES_FILE, SCORE_FILE
+
+DATA_NASCIMENTO = "1990-01-01"
+
+def credit_conversation(cpf):
+    return [
+        "Olá",
+        f"Meu CPF é {cpf} e nasci em {DATA_NASCIMENTO}",
+        "Qual é o meu limite?",
+        "Quero aumentar meu limite para 5000",
+        "Sim, pode ser",
+        "Minha renda é 9000, trabalho formal, 0 dependentes, sem dívidas e despesas de 1500",
+        "Quero aumentar meu limite para 5000",
+    ]
+
+def cambio_conversation(cpf):
+    return [
+        "Olá",
+        f"Meu CPF é {cpf} e nasci em {DATA_NASCIMENTO}",
+        "Qual a cotação do dólar?",
+        "E o euro e a libra?",
+        "Quero converter 100 dólares",
+        "Obrigado, pode encerrar",
+    ]
+
+CONVERSATIONS = [credit_conversation, cambio_conversation]
+
+def build_clients(data_dir, clients):
+    """Grava em `data_dir` uma base com `clients` clientes (perfil do primeiro cliente de exemplo) e retorna os CPFs."""
+    os.makedirs(data_dir, exist_ok=True)
+    template = pd.read_csv(CLIENTES_FILE, dtype={"cpf": str}).iloc[[0]]
+    df = pd.concat([template] * clients, ignore_index=True)
+    df["cpf"] = [f"{i:011d}" for i in range(1, clients + 1)]
+    df["data_nascimento"] = DATA_NASCIMENTO
+    df.to_csv(os.path.join(data_dir, "clientes.csv"), index=False)
+    shutil.copy(SCORE_FILE, data_dir)
+    return list(df["cpf"])
@@ -0,0 +1,74 @@
+"""Verificação de paridade: calculate_scores (vetorizada) x calculate_score (linha a linha).
+
+Monta uma base com os casos de borda (0, 1, 2, 3, 10 e "3+" dependentes,
+dependentes como texto, tipos de emprego e respostas de dívida desconhecidos,
+despesas zero, scores abaixo de 0 e acima de 1000) e linhas sorteadas, grava
+em CSV e lê de volta como o rescore faz. Cada score vetorizado deve ser igual
+ao de calculate_score na mesma linha.
+
+O projeto não tem suíte de testes: esta verificação termina com código 1 se
+houver divergência, para ser usada como etapa de CI.
+
+Uso: python -m bench.score_parity [--rows 10000] [--seed 0]
+"""
+import argparse
+import os
+import random
+import tempfile
+
+import pandas as pd
+
+from src.utils import PESO_DIVIDAS, PESO_EMPREGO, calculate_score, calculate_scores
+
+EDGE_DEPENDENTES = [0, 1, 2, 3, 4, 10, "3+", "0", "2"]
+EDGE_EMPREGOS = list(PESO_EMPREGO) + ["estagiario", "Formal", ""]
+EDGE_DIVIDAS = list(PESO_DIVIDAS) + ["talvez", "Sim"]
+
+def edge_rows():
+    rows = []
+    for dependentes in EDGE_DEPENDENTES:
+        for tipo_emprego in EDGE_EMPREGOS:
+            for tem_dividas in EDGE_DIVIDAS:
+                for renda, despesas in [(3000.0, 1500.0), (0.0, 0.0), (0.0, 5000.0), (100000.0, 0.0)]:
+                    rows.append((renda, tipo_emprego, dependentes, tem_dividas, despesas))
+    return rows
+
+def random_rows(count, rng):
+    empregos = EDGE_EMPREGOS
+    dependentes = list(range(6)) + ["3+"]
+    dividas = EDGE_DIVIDAS
+    return [
+        (round(rng.uniform(0, 30000), 2), rng.choice(empregos), rng.choice(dependentes),
+         rng.choice(dividas), round(rng.uniform(0, 20000), 2))
+        for _ in range(count)
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000, help="Linhas sorteadas além dos casos de borda.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rows = edge_rows() + random_rows(args.rows, random.Random(args.seed))
+    df = pd.DataFrame(rows, columns=['renda_mensal', 'tipo_emprego', 'dependentes', 'tem_dividas', 'despesas'])
+    with tempfile.TemporaryDirectory(prefix="bench-score-") as tmp_dir:
+        # Mesma leitura do rescore: os tipos das colunas vêm do CSV
+        path = os.path.join(tmp_dir, "clientes.csv")
+        df.to_csv(path, index=False)
+        df = pd.read_csv(path)
+
+    vectorized = calculate_scores(df)
+    mismatches = []
+    for i, row in enumerate(df.itertuples(index=False)):
+        expected = calculate_score(row.renda_mensal, row.tipo_emprego, row.dependentes, row.tem_dividas, row.despesas)
+        if vectorized[i] != expected:
+            mismatches.append((tuple(row), expected, int(vectorized[i])))
+
+    print(f"{len(df)} linhas ({len(edge_rows())} casos de borda) | divergências: {len(mismatches)}")
+    for row, expected, got in mismatches[:20]:
+        print(f"  {row}: calculate_score={expected} calculate_scores={got}")
+    if mismatches:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
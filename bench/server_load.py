@@ -0,0 +1,136 @@
+"""Teste de carga do servidor de conversas (src/server.py) com vários workers uvicorn.
+
+Sobe `uvicorn bench.stub_server:app --workers N` sobre uma base SQLite
+temporária, com LLM roteirizado e API de câmbio local, e reproduz os roteiros
+de bench/scenarios.py por HTTP, com `--concurrency` sessões simultâneas.
+Turnos recusados (429/503) são repetidos após o Retry-After e contados.
+
+Relatório: turnos/s, percentis de latência por turno e respostas por status
+(inclusive as recusas).
+
+Uso: python -m bench.server_load [--workers 2] [--sessions 100] [--concurrency 32]
+                                 [--latency 0.2] [--max-concurrency 8] [--max-queue 32]
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+import httpx
+
+from bench.fakes import ExchangeRateStub
+from bench.scenarios import CONVERSATIONS, build_clients
+from src.tracing import percentile
+from src.utils import import_csv_to_sqlite
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_server(args, tmp_dir, exchange_url, port):
+    env = {
+        **os.environ,
+        "GOOGLE_API_KEY": os.getenv("GOOGLE_API_KEY", "stub"),
+        "STORAGE_BACKEND": "sqlite",
+        "SQLITE_DB": os.path.join(tmp_dir, "banco.sqlite"),
+        "CHECKPOINT_DB": os.path.join(tmp_dir, "checkpoints.sqlite"),
+        "EXCHANGERATE_BASE_URL": exchange_url,
+        "EXCHANGERATE_API_KEY": "stub",
+        "BENCH_LLM_LATENCY": str(args.latency),
+        "SERVER_MAX_CONCURRENCY": str(args.max_concurrency),
+        "SERVER_MAX_QUEUE": str(args.max_queue),
+        "SERVER_RETRY_AFTER": "1",
+    }
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "bench.stub_server:app", "--port", str(port),
+         "--workers", str(args.workers), "--log-level", "warning"],
+        env=env,
+    )
+
+async def wait_ready(client, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("O servidor encerrou durante a inicialização")
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("O servidor não respondeu a tempo")
+
+async def run_session(client, index, cpfs, stats):
+    session_id = (await client.post("/sessions")).json()["session_id"]
+    for text in CONVERSATIONS[index % len(CONVERSATIONS)](cpfs[index % len(cpfs)]):
+        while True:
+            start = time.perf_counter()
+            response = await client.post(f"/sessions/{session_id}/turns", json={"message": text})
+            stats["status"][response.status_code] += 1
+            if response.status_code not in (429, 503):
+                break
+            await asyncio.sleep(float(response.headers.get("Retry-After", 1)))
+        response.raise_for_status()
+        stats["latencies"].append((time.perf_counter() - start) * 1000)
+
+async def run(args, port, cpfs):
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=120, limits=limits) as client:
+        semaphore = asyncio.Semaphore(args.concurrency)
+        stats = {"status": Counter(), "latencies": []}
+
+        async def bounded(index):
+            async with semaphore:
+                await run_session(client, index, cpfs, stats)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(bounded(i) for i in range(args.sessions)))
+        return stats, time.perf_counter() - start
+
+async def serve_and_run(args, process, port, cpfs):
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}") as client:
+        await wait_ready(client, process)
+    return await run(args, port, cpfs)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--sessions", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--latency", type=float, default=0.2, help="Latência simulada por chamada ao LLM (s).")
+    parser.add_argument("--max-concurrency", type=int, default=8, help="SERVER_MAX_CONCURRENCY de cada worker.")
+    parser.add_argument("--max-queue", type=int, default=32, help="SERVER_MAX_QUEUE de cada worker.")
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp(prefix="bench-server-")
+    data_dir = os.path.join(tmp_dir, "data")
+    cpfs = build_clients(data_dir, args.sessions)
+    import_csv_to_sqlite(os.path.join(tmp_dir, "banco.sqlite"), data_dir)
+    stub = ExchangeRateStub().start()
+    port = free_port()
+    process = start_server(args, tmp_dir, stub.url, port)
+    try:
+        stats, elapsed = asyncio.run(serve_and_run(args, process, port, cpfs))
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+        stub.stop()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    latencies = sorted(stats["latencies"])
+    turns = len(latencies)
+    print(f"workers: {args.workers} | sessões: {args.sessions} | concorrência: {args.concurrency} | "
+          f"limite por worker: {args.max_concurrency} (+{args.max_queue} na fila)")
+    print(f"turnos: {turns} em {elapsed:.2f} s -> {turns / elapsed:.1f} turnos/s")
+    print(f"latência por turno (ms): p50 {percentile(latencies, 50):.0f} | p95 {percentile(latencies, 95):.0f} | p99 {percentile(latencies, 99):.0f}")
+    print(f"respostas por status: {dict(sorted(stats['status'].items()))}")
+
+if __name__ == "__main__":
+    main()
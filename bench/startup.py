@@ -0,0 +1,134 @@
+"""Tempo de inicialização: importar src.graph e ficar pronto para o primeiro turno.
+
+Cada rodada é um processo Python novo (`python -X importtime`) que mede três
+fases: importar src.graph, compilar o grafo e montar os agentes (criar o
+ChatGoogleGenerativeAI e vincular as ferramentas; nenhuma requisição é feita).
+Antes do carregamento sob demanda tudo acontecia já na importação; agora
+importar é barato e o resto é pago no primeiro uso.
+
+Com `--ref`, a mesma medição roda numa cópia da árvore em outra revisão do git
+(ex: `--ref HEAD~1`) para comparar com a linha de base.
+
+Relatório: mediana de cada fase, processo completo e os pacotes mais caros da
+importação segundo o `-X importtime`.
+
+Uso: python -m bench.startup [--runs 5] [--ref <revisão>] [--top 8] [--json saida.json]
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MARKER = "startup-bench: import"
+
+# Funciona também em árvores antigas, em que o grafo e os agentes eram montados
+# na importação; o baseline só tem `agents.llm` (nem AGENTS nem get_agents)
+CHILD = f"""
+import json, sys, time
+t0 = time.perf_counter()
+import src.graph as graph
+t1 = time.perf_counter()
+sys.stderr.write({MARKER!r} + "\\n")
+sys.stderr.flush()
+graph.get_app_graph() if hasattr(graph, "get_app_graph") else graph.app_graph
+t2 = time.perf_counter()
+import src.agents as agents
+if hasattr(agents, "get_agents"):
+    agents.get_agents()
+else:
+    getattr(agents, "AGENTS", None) or agents.llm
+t3 = time.perf_counter()
+print(json.dumps({{"import": t1 - t0, "graph": t2 - t1, "agents": t3 - t2}}))
+"""
+
+PHASES = ["import", "graph", "agents"]
+
+def parse_importtime(stderr):
+    """Módulos importados antes do marcador: nome -> tempo cumulativo (ms)."""
+    imports = {}
+    for line in stderr.splitlines():
+        if line.startswith(MARKER):
+            break
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        imports[name.strip()] = int(cumulative) / 1000
+    return imports
+
+def run_once(tree, env):
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", CHILD], cwd=tree, env=env,
+                            capture_output=True, text=True, check=True)
+    phases = {name: seconds * 1000 for name, seconds in json.loads(result.stdout.splitlines()[-1]).items()}
+    phases["process"] = (time.perf_counter() - start) * 1000
+    return phases, parse_importtime(result.stderr)
+
+def measure(tree, runs, tmp_dir):
+    env = {
+        **os.environ,
+        "GOOGLE_API_KEY": os.getenv("GOOGLE_API_KEY", "stub"),
+        "CHECKPOINT_DB": os.path.join(tmp_dir, "checkpoints.sqlite"),
+        "PYTHONPATH": tree,
+    }
+    run_once(tree, env)  # Aquecimento: compila os .pyc da árvore
+    samples = [run_once(tree, env) for _ in range(runs)]
+    report = {name: statistics.median(phases[name] for phases, _ in samples) for name in PHASES + ["process"]}
+    report["ready"] = report["import"] + report["graph"] + report["agents"]
+    imports = samples[-1][1]
+    report["packages"] = {name: ms for name, ms in imports.items() if "." not in name and name != "src"}
+    return report
+
+def export_tree(ref, tmp_dir):
+    """Cópia da árvore do git na revisão `ref` (git archive)."""
+    tree = os.path.join(tmp_dir, "ref")
+    os.makedirs(tree)
+    archive = os.path.join(tmp_dir, "ref.tar")
+    subprocess.run(["git", "archive", "--format=tar", "-o", archive, ref], cwd=ROOT, check=True)
+    with tarfile.open(archive) as tar:
+        tar.extractall(tree, filter="data")
+    return tree
+
+def print_report(label, report, top):
+    print(f"{label}: importar {report['import']:.0f} ms | compilar o grafo {report['graph']:.0f} ms | "
+          f"montar os agentes {report['agents']:.0f} ms | pronto {report['ready']:.0f} ms | "
+          f"processo {report['process']:.0f} ms")
+    heaviest = sorted(report["packages"].items(), key=lambda item: item[1], reverse=True)[:top]
+    print("  importados por src.graph: " + ", ".join(f"{name} {ms:.0f} ms" for name, ms in heaviest))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Processos medidos por árvore (mediana).")
+    parser.add_argument("--ref", help="Revisão do git usada como linha de base (ex: HEAD~1).")
+    parser.add_argument("--top", type=int, default=8, help="Pacotes listados por árvore.")
+    parser.add_argument("--json", help="Grava o relatório neste arquivo (para comparar execuções).")
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp(prefix="bench-startup-")
+    try:
+        reports = {"atual": measure(ROOT, args.runs, tmp_dir)}
+        if args.ref:
+            reports[args.ref] = measure(export_tree(args.ref, tmp_dir), args.runs, tmp_dir)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print(f"mediana de {args.runs} processos (python -X importtime)")
+    for label, report in reports.items():
+        print_report(label, report, args.top)
+    if args.ref:
+        base, current = reports[args.ref], reports["atual"]
+        print(f"importar src.graph: {base['import'] / current['import']:.1f}x mais rápido | "
+              f"pronto para o primeiro turno: {current['ready'] - base['ready']:+.0f} ms")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(reports, f, indent=2, ensure_ascii=False)
+
+if __name__ == "__main__":
+    main()
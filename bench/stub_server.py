@@ -0,0 +1,15 @@
+"""src.server com o ScriptedChatModel no lugar do Gemini, para testes de carga sem rede.
+
+Usado por bench/server_load.py: uvicorn bench.stub_server:app --workers N
+(latência simulada por chamada ao LLM em BENCH_LLM_LATENCY, em segundos).
+"""
+import os
+
+os.environ.setdefault("GOOGLE_API_KEY", "stub")
+
+from bench.fakes import ScriptedChatModel
+from src.agents import set_llm
+
+set_llm(ScriptedChatModel(latency=float(os.getenv("BENCH_LLM_LATENCY", 0))))
+
+from src.server import app  # noqa: E402
@@ -1,115 +1,157 @@
-from langchain_core.tools import tool
-from langchain_google_genai import ChatGoogleGenerativeAI
+from dotenv import load_dotenv
+
+# Antes dos módulos de src, que leem variáveis de ambiente ao serem importados
+load_dotenv()
+
+from langchain_core.tools import StructuredTool, tool
+from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables.config import run_in_executor
 from src.utils import (
-    authenticate_user, 
     get_max_limit_for_score, 
     log_limit_request, 
     calculate_score, 
-    update_user_score,
-    load_clientes
+    save_interview,
+    modify_cliente,
+    get_cliente
 )
+from src.auth import get_auth_service
+from src.cambio import ExchangeRateError, get_exchange_client
+from src.tracing import span, traced
+from langchain_core.messages import HumanMessage, SystemMessage
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import timedelta
+import contextvars
+import functools
+import logging
 import os
-import requests
-from dotenv import load_dotenv
+import threading
+import time
 
-load_dotenv()
+logger = logging.getLogger(__name__)
 
-llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash", google_api_key=os.getenv("GOOGLE_API_KEY"))
+GEMINI_MODEL = "gemini-2.5-flash"
 
-@tool
-def check_auth(cpf: str, data_nascimento: str):
+# Pool para o I/O bloqueante de armazenamento quando o grafo roda de forma assíncrona
+STORAGE_EXECUTOR = ThreadPoolExecutor(max_workers=int(os.getenv("STORAGE_THREADS", 8)), thread_name_prefix="storage")
+
+def storage_tool(func):
+    """Como @tool; no modo assíncrono a função roda no STORAGE_EXECUTOR, fora do event loop.
+
+    Cada execução gera um span `tool.<nome>` (ver src/tracing.py).
+    """
+    name = f"tool.{func.__name__}"
+    @functools.wraps(func)  # Mantém as anotações: o RunnableConfig também é injetado no modo assíncrono
+    async def coroutine(*args, **kwargs):
+        with span(name):
+            # Copia o contexto para que os spans de armazenamento entrem no trace do turno
+            return await run_in_executor(STORAGE_EXECUTOR, contextvars.copy_context().run, func, *args, **kwargs)
+    return StructuredTool.from_function(func=traced(name)(func), coroutine=coroutine)
+
+def tool_with_coroutine(coroutine):
+    """Como @tool, usando `coroutine` como implementação nativa para ainvoke."""
+    def decorator(func):
+        name = f"tool.{func.__name__}"
+        return StructuredTool.from_function(func=traced(name)(func), coroutine=traced(name)(coroutine))
+    return decorator
+
+@storage_tool
+def check_auth(cpf: str, data_nascimento: str, config: RunnableConfig = None):
     """Autentica o usuário com CPF e Data de Nascimento (formato YYYY-MM-DD). Retorna os dados do usuário se sucesso."""
-    user = authenticate_user(cpf, data_nascimento)
-    if user:
-        return {"status": "success", "user": user}
+    # A sessão (thread_id) entra no limite de tentativas junto com o CPF
+    session = (config or {}).get("configurable", {}).get("thread_id")
+    result = get_auth_service().authenticate(cpf, data_nascimento, session)
+    if result.status == "success":
+        return {"status": "success", "user": result.user}
+    if result.status == "blocked":
+        minutes = max(1, round(result.retry_after / 60))
+        return {"status": "blocked", "message": f"Muitas tentativas de autenticação. Tente novamente em {minutes} minuto(s)."}
     return {"status": "failed", "message": "Autenticação falhou. Verifique os dados."}
 
-@tool
+@storage_tool
 def get_credit_limit(cpf: str):
     """Consulta o limite de crédito atual do usuário."""
-    df = load_clientes()
-    user = df[df['cpf'] == cpf]
-    if not user.empty:
-        return f"Seu limite atual é R\$ {user.iloc[0]['limite']}"
+    user = get_cliente(cpf)
+    if user is not None:
+        return f"Seu limite atual é R\$ {user['limite']}"
     return "Usuário não encontrado."
 
-@tool
+@storage_tool
 def request_limit_increase(cpf: str, new_limit: float):
     """Solicita aumento de limite de crédito. Verifica score e aprova/rejeita."""
-    df = load_clientes()
-    user = df[df['cpf'] == cpf]
-    if user.empty:
+    def approve_if_allowed(user):
+        if new_limit <= get_max_limit_for_score(user['score']):
+            return {'limite': new_limit}
+
+    # Leitura do score e gravação do limite atômicas por CPF (sem perder uma entrevista concorrente)
+    user, approved = modify_cliente(cpf, approve_if_allowed)
+    if user is None:
         return "Usuário não encontrado."
     
-    current_score = user.iloc[0]['score']
-    current_limit = user.iloc[0]['limite']
-    max_allowed = get_max_limit_for_score(current_score)
+    current_score = user['score']
+    current_limit = user['limite']
     
-    if new_limit <= max_allowed:
+    if approved:
         status = "aprovado"
-        # Atualiza limite no BD (simplificado, geralmente seria uma etapa separada)
-        df.loc[df['cpf'] == cpf, 'limite'] = new_limit
-        df.to_csv(os.path.join('data', 'clientes.csv'), index=False)
         msg = f"Parabéns! Seu aumento para R\$ {new_limit} foi APROVADO."
     else:
         status = "rejeitado"
+        max_allowed = get_max_limit_for_score(current_score)
         msg = f"Solicitação REJEITADA. Seu score ({current_score}) permite no máximo R\$ {max_allowed}. Gostaria de fazer uma entrevista para tentar aumentar seu score?"
         
     log_limit_request(cpf, current_limit, new_limit, status)
     return msg
 
-@tool
+@storage_tool
 def process_interview(cpf: str, renda: float, tipo_emprego: str, dependentes: int, tem_dividas: str, despesas: float):
     """Processa a entrevista de crédito, recalcula e atualiza o score."""
     new_score = calculate_score(renda, tipo_emprego, dependentes, tem_dividas, despesas)
-    update_user_score(cpf, new_score)
+    save_interview(cpf, new_score, renda, tipo_emprego, dependentes, tem_dividas, despesas)
     return f"Entrevista concluída. Seu novo score é {new_score}. Você pode tentar solicitar o aumento de limite novamente."
 
-@tool
+def format_rates(rates):
+    lines = []
+    for currency, rate in rates.items():
+        if rate is None:
+            lines.append(f"Não foi possível obter a cotação para {currency} em BRL. Verifique se a moeda é válida.")
+        else:
+            lines.append(f"A cotação atual do {currency} é R\$ {rate:.2f}")
+    return "\n".join(lines)
+
+async def aget_exchange_rate(currency: str = "USD"):
+    try:
+        rate = await get_exchange_client().aget_rate(currency)
+    except ExchangeRateError as e:
+        return str(e)
+    return format_rates({currency.upper(): rate})
+
+@tool_with_coroutine(aget_exchange_rate)
 def get_exchange_rate(currency: str = "USD"):
     """Consulta a taxa de câmbio atual usando exchangerate.host."""
-    api_key = os.getenv("EXCHANGERATE_API_KEY")
-    if not api_key:
-        return "Erro de configuração: API Key não encontrada."
-    
-    # A API gratuita pode ter limitações no 'source'. Se falhar com source diferente de USD,
-    # teríamos que usar USD como source e converter, mas vamos tentar usar o source solicitado.
-    url = "http://api.exchangerate.host/live"
-    params = {
-        "access_key": api_key,
-        "source": currency.upper(),
-        "currencies": "BRL",
-        "format": 1
-    }
-    
     try:
-        response = requests.get(url, params=params)
-        data = response.json()
-        
-        if data.get("success"):
-            quotes = data.get("quotes", {})
-            # A chave em quotes é geralmente SOURCE+DEST, ex: USDBRL
-            pair = f"{currency.upper()}BRL"
-            rate = quotes.get(pair)
-            if rate:
-                return f"A cotação atual do {currency.upper()} é R\$ {rate:.2f}"
-            else:
-                return f"Não foi possível obter a cotação para {currency} em BRL. Verifique se a moeda é válida."
-        else:
-            # Tentar fallback se o erro for relacionado ao Source (plano gratuito muitas vezes só permite USD)
-            # Mas vamos primeiro retornar o erro para debug se necessário, ou tratar silenciosamente.
-            error_code = data.get("error", {}).get("code")
-            error_info = data.get("error", {}).get("info", "Erro desconhecido")
-            
-            if error_code == 105: # Access Restricted (provavelmente source não permitido)
-                 return f"Erro: O plano atual da API não permite mudar a moeda base de USD. Tente converter USD."
-            
-            return f"Erro na API de câmbio: {error_info}"
-            
-    except Exception as e:
-        return f"Erro ao conectar com serviço de câmbio: {str(e)}"
+        rate = get_exchange_client().get_rate(currency)
+    except ExchangeRateError as e:
+        return str(e)
+    return format_rates({currency.upper(): rate})
+
+async def aget_exchange_rates(currencies: list[str]):
+    try:
+        rates = await get_exchange_client().aget_rates(currencies)
+    except ExchangeRateError as e:
+        return str(e)
+    return format_rates(rates)
+
+@tool_with_coroutine(aget_exchange_rates)
+def get_exchange_rates(currencies: list[str]):
+    """Consulta de uma só vez as cotações atuais de várias moedas em BRL (ex: ["USD", "EUR", "GBP"])."""
+    try:
+        rates = get_exchange_client().get_rates(currencies)
+    except ExchangeRateError as e:
+        return str(e)
+    return format_rates(rates)
 
 @tool
+@traced("tool.end_conversation")
 def end_conversation():
     """Encerra a conversa explicitamente quando o usuário solicitar."""
     return "Conversa encerrada pelo usuário."
@@ -122,6 +164,7 @@ Seu objetivo é autenticar o cliente.
 3. Use a ferramenta `check_auth` para validar.
 4. Se autenticado com sucesso, cumprimente o usuário e pergunte qual opção ele deseja. (Crédito ou Câmbio).
 5. Se falhar, peça para tentar novamente.
+6. Se o status for `blocked`, informe que o acesso está temporariamente bloqueado pelo tempo indicado e não tente novamente.
 Caso o usuário queira sair, use a ferramenta `end_conversation`.
 """
 
@@ -156,7 +199,8 @@ Caso o usuário queira sair, use a ferramenta `end_conversation`.
 """
 
 CAMBIO_PROMPT = """Você é o Agente de Câmbio.
-Forneça cotações de moedas usando `get_exchange_rate`.
+Forneça cotações de moedas usando `get_exchange_rates`.
+Passe TODAS as moedas pedidas pelo usuário numa única chamada (ex: ["USD", "EUR", "GBP"]), mesmo que seja só uma.
 
 IMPORTANTE SOBRE FORMATAÇÃO:
 - JAMAIS use formatação LaTeX. Escreva valores como texto simples (ex: "R$ 5,50").
@@ -164,3 +208,172 @@ IMPORTANTE SOBRE FORMATAÇÃO:
 Após fornecer a cotação, pergunte se o usuário deseja ver outra moeda ou precisa de mais alguma ajuda.
 Caso o usuário queira sair, use a ferramenta `end_conversation`.
 """
+
+# --- Registro de Agentes ---
+
+# Margem para não usar um cache prestes a expirar
+CACHE_EXPIRY_MARGIN = 60
+# Um novo cache é criado (em segundo plano) quando faltar menos que isto para o atual expirar
+CACHE_RENEW_BEFORE = 300
+# Espera entre tentativas de renovação que falharam
+CACHE_RETRY_INTERVAL = 60
+
+@dataclass
+class AgentSpec:
+    """Agente pronto para uso: prompt, ferramentas e o modelo já com as ferramentas vinculadas.
+
+    Tudo é montado uma vez (em build_agents), não a cada turno. Com
+    GEMINI_CONTEXT_CACHE=1, o prompt e as declarações das ferramentas também
+    ficam num cache de contexto do Gemini e não são reenviados a cada chamada.
+    Perto de expirar, o cache é recriado numa thread, e as chamadas continuam
+    usando o atual até o novo ficar pronto.
+    """
+    name: str
+    prompt: str
+    tools: list
+    runnable: object
+    system_message: SystemMessage
+    cached_runnable: object = None
+    cache_expires_at: float = 0.0
+    model: object = None       # Modelo sem ferramentas, base do cached_runnable
+    cache_ttl: int = 0         # 0: sem cache de contexto
+    cache_retry_at: float = 0.0
+    _renewing: bool = field(default=False, repr=False)
+    _renew_lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def request(self, window, summary=""):
+        """Retorna (modelo, mensagens) para a janela de contexto atual."""
+        now = time.time()
+        if self.cache_ttl and now >= self.cache_retry_at and now >= self.cache_expires_at - min(CACHE_RENEW_BEFORE, self.cache_ttl / 2):
+            self._start_cache_renewal()
+        if self.cached_runnable is not None and now < self.cache_expires_at:
+            # O prompt de sistema está no cache; o resumo vai como mensagem
+            prefix = [HumanMessage(content=f"Resumo da conversa anterior:\n{summary}")] if summary else []
+            return self.cached_runnable, prefix + window
+        if summary:
+            system = SystemMessage(content=f"{self.prompt}\nResumo da conversa anterior:\n{summary}\n")
+        else:
+            system = self.system_message
+        return self.runnable, [system] + window
+
+    def create_cache(self):
+        """Cria um novo cache de contexto e passa a usá-lo (chamada de rede)."""
+        cache_name = create_context_cache(self.prompt, self.tools, self.cache_ttl)
+        self.cache_expires_at = time.time() + self.cache_ttl - CACHE_EXPIRY_MARGIN
+        self.cached_runnable = self.model.model_copy(update={"cached_content": cache_name})
+
+    def _start_cache_renewal(self):
+        with self._renew_lock:
+            if self._renewing:
+                return
+            self._renewing = True
+        threading.Thread(target=self._renew_cache, name=f"context-cache-{self.name}", daemon=True).start()
+
+    def _renew_cache(self):
+        try:
+            self.create_cache()
+        except Exception as e:
+            # Até o próximo intervalo, usa o cache atual enquanto valer e depois o modo normal
+            logger.warning("Falha ao renovar o cache de contexto do agente %s: %s", self.name, e)
+            self.cache_retry_at = time.time() + CACHE_RETRY_INTERVAL
+        finally:
+            with self._renew_lock:
+                self._renewing = False
+
+AGENT_DEFINITIONS = {
+    "triagem": (TRIAGEM_PROMPT, [check_auth, end_conversation]),
+    "credito": (CREDITO_PROMPT, [get_credit_limit, request_limit_increase, end_conversation]),
+    "entrevista": (ENTREVISTA_PROMPT, [process_interview, end_conversation]),
+    "cambio": (CAMBIO_PROMPT, [get_exchange_rates, end_conversation]),
+}
+
+def create_context_cache(prompt, tools, ttl):
+    """Cria um cache de contexto do Gemini com o prompt e as ferramentas; retorna o nome do cache."""
+    import google.ai.generativelanguage_v1beta as glm
+    from google.api_core.client_options import ClientOptions
+    from langchain_google_genai._function_utils import convert_to_genai_function_declarations
+
+    client = glm.CacheServiceClient(client_options=ClientOptions(api_key=os.getenv("GOOGLE_API_KEY")))
+    cache = client.create_cached_content(cached_content=glm.CachedContent(
+        model=f"models/{GEMINI_MODEL}",
+        system_instruction=glm.Content(parts=[glm.Part(text=prompt)]),
+        tools=[convert_to_genai_function_declarations(tools)],
+        ttl=timedelta(seconds=ttl),
+    ))
+    return cache.name
+
+def build_agents(model):
+    agents = {}
+    use_cache = os.getenv("GEMINI_CONTEXT_CACHE", "0") == "1"
+    if use_cache:
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        use_cache = isinstance(model, ChatGoogleGenerativeAI)
+    ttl = int(os.getenv("GEMINI_CONTEXT_CACHE_TTL", 3600))
+    for name, (prompt, tools) in AGENT_DEFINITIONS.items():
+        spec = AgentSpec(
+            name=name,
+            prompt=prompt,
+            tools=tools,
+            runnable=model.bind_tools(tools),
+            system_message=SystemMessage(content=prompt),
+        )
+        if use_cache:
+            spec.model, spec.cache_ttl = model, ttl
+            try:
+                spec.create_cache()
+            except Exception as e:
+                # Ex: prompt abaixo do mínimo de tokens exigido para cache; não é renovado
+                spec.cache_ttl = 0
+                logger.warning("Cache de contexto indisponível para o agente %s: %s", name, e)
+        agents[name] = spec
+    return agents
+
+# O modelo e os agentes são criados no primeiro uso, não na importação:
+# langchain_google_genai é o import mais caro da inicialização
+_llm = None
+_agents = None
+_agents_lock = threading.Lock()
+
+def create_llm():
+    """Modelo padrão dos agentes (Gemini)."""
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    return ChatGoogleGenerativeAI(model=GEMINI_MODEL, google_api_key=os.getenv("GOOGLE_API_KEY"))
+
+def get_llm():
+    global _llm
+    with _agents_lock:
+        if _llm is None:
+            with span("startup.create_llm"):
+                _llm = create_llm()
+        return _llm
+
+def get_agents():
+    """Registro dos agentes (nome -> AgentSpec), montado uma vez com o modelo atual."""
+    global _agents
+    if _agents is not None:
+        return _agents  # Caminho de cada turno, sem trava
+    model = get_llm()
+    with _agents_lock:
+        if _agents is None:
+            with span("startup.build_agents"):
+                _agents = build_agents(model)
+        return _agents
+
+def set_llm(model):
+    """Troca o modelo usado pelos agentes (ex: um modelo simulado em benchmarks)."""
+    global _llm, _agents
+    agents = build_agents(model)
+    with _agents_lock:
+        _llm = model
+        if _agents is None:
+            _agents = agents
+        else:
+            _agents.update(agents)  # Mantém válidas as referências já obtidas
+
+def __getattr__(name):
+    # `agents.llm` e `agents.AGENTS` continuam disponíveis, criados no primeiro acesso
+    if name == "llm":
+        return get_llm()
+    if name == "AGENTS":
+        return get_agents()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,245 @@
+import atexit
+import csv
+import io
+import itertools
+import logging
+import os
+import queue
+import threading
+import time
+from src.tracing import span
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+_segment_seq = itertools.count(1)
+
+FSYNC_POLICIES = ("batch", "rotate", "never")
+
+# Tentativas de gravar o último lote ao encerrar
+STOP_RETRIES = 3
+
+class AuditLog:
+    """Log de auditoria append-only gravado em segundo plano (write-behind).
+
+    `append` só enfileira a linha; uma thread grava as linhas em lotes, quando
+    o lote atinge `batch_size` ou quando a mais antiga espera `flush_interval`
+    segundos. Os lotes vão para segmentos CSV em `directory`, um novo a cada
+    `segment_rows` linhas e a cada processo (o nome leva instante, pid e
+    sequência, então processos diferentes nunca escrevem no mesmo arquivo).
+
+    Política de fsync (`fsync`):
+    - "batch": fsync a cada lote gravado (padrão);
+    - "rotate": fsync só ao fechar um segmento;
+    - "never": fica a cargo do sistema operacional.
+
+    Uma queda no meio de uma gravação deixa no máximo uma linha incompleta no
+    fim do último segmento, que a leitura descarta. Um lote que falha (OSError)
+    continua na memória e é gravado de novo num segmento novo; `flush` só
+    retorna True depois que tudo o que veio antes dele foi gravado. `close`
+    (registrado no atexit) grava o que estiver na fila antes de encerrar.
+    """
+
+    def __init__(self, directory, columns, legacy_file=None, batch_size=100, flush_interval=1.0,
+                 segment_rows=10_000, fsync="batch", max_queue=10_000):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Política de fsync inválida: {fsync}")
+        self.directory = directory
+        self.columns = list(columns)
+        self.legacy_file = legacy_file
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.segment_rows = segment_rows
+        self.fsync = fsync
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        self._file = None
+        self._rows_in_segment = 0
+
+    @classmethod
+    def from_env(cls, directory, columns, legacy_file=None):
+        return cls(
+            directory, columns, legacy_file,
+            batch_size=int(os.getenv("AUDIT_BATCH_SIZE", 100)),
+            flush_interval=float(os.getenv("AUDIT_FLUSH_INTERVAL", 1.0)),
+            segment_rows=int(os.getenv("AUDIT_SEGMENT_ROWS", 10_000)),
+            fsync=os.getenv("AUDIT_FSYNC", "batch"),
+        )
+
+    # --- Escrita ---
+    def append(self, row):
+        """Enfileira uma linha; bloqueia apenas se a fila estiver cheia (gravação atrasada)."""
+        self._ensure_thread()
+        self._queue.put({c: row.get(c) for c in self.columns})
+
+    def flush(self, timeout=None):
+        """Aguarda a gravação de tudo o que foi enfileirado até agora."""
+        if self._thread is None or not self._thread.is_alive():
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout=None):
+        with self._thread_lock:
+            thread, self._thread = self._thread, None
+        if thread is not None and thread.is_alive():
+            self._queue.put(_STOP)
+            thread.join(timeout)
+
+    def _ensure_thread(self):
+        if self._thread is not None:
+            return
+        with self._thread_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def _run(self):
+        batch = []
+        waiters = []  # flush() pendentes: só são liberados depois que o lote anterior foi gravado
+        deadline = None
+        while True:
+            timeout = None if not batch else max(deadline - time.monotonic(), 0)
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None  # Tempo do lote esgotado
+            if isinstance(item, dict):
+                batch.append(item)
+                if len(batch) == 1:
+                    deadline = time.monotonic() + self.flush_interval
+                if len(batch) < self.batch_size:
+                    continue
+            elif isinstance(item, threading.Event):
+                waiters.append(item)
+            if item is _STOP:
+                self._write_before_stop(batch)
+                for waiter in waiters:
+                    waiter.set()
+                try:
+                    self._close_segment()
+                except OSError:
+                    logger.exception("Falha ao fechar o segmento do log de auditoria em %s", self.directory)
+                return
+            if batch:
+                try:
+                    self._write(batch)
+                    batch = []
+                except OSError:
+                    # Mantém o lote (e quem espera por ele) e tenta de novo no próximo ciclo
+                    logger.exception("Falha ao gravar o log de auditoria em %s", self.directory)
+                    deadline = time.monotonic() + self.flush_interval
+                    continue
+            for waiter in waiters:
+                waiter.set()
+            waiters = []
+
+    def _write_before_stop(self, batch):
+        """Última gravação ao encerrar: algumas tentativas e, se todas falharem, as linhas vão para o log de erros."""
+        for attempt in range(STOP_RETRIES):
+            if not batch:
+                return
+            try:
+                self._write(batch)
+                return
+            except OSError:
+                logger.exception("Falha ao gravar o log de auditoria em %s (tentativa %d de %d)",
+                                 self.directory, attempt + 1, STOP_RETRIES)
+                time.sleep(min(self.flush_interval, 1.0))
+        logger.error("Log de auditoria encerrado sem gravar %d linha(s): %s", len(batch), batch)
+
+    def _write(self, rows):
+        with span("audit.write", rows=len(rows)):
+            if self._file is None or self._rows_in_segment >= self.segment_rows:
+                self._rotate()
+            buffer = io.StringIO()
+            csv.DictWriter(buffer, fieldnames=self.columns, lineterminator="\n").writerows(rows)
+            start = self._file.tell()
+            try:
+                self._file.write(buffer.getvalue())  # Um único write por lote
+                self._file.flush()
+                if self.fsync == "batch":
+                    os.fsync(self._file.fileno())
+            except OSError:
+                self._abandon_segment(start)
+                raise
+            self._rows_in_segment += len(rows)
+
+    def _abandon_segment(self, size):
+        """Descarta o que o lote que falhou gravou pela metade; a nova tentativa abre outro segmento."""
+        file, self._file = self._file, None
+        try:
+            os.ftruncate(file.fileno(), size)
+        except OSError:
+            pass  # A leitura ainda descarta uma linha incompleta no fim do segmento
+        try:
+            file.close()
+        except OSError:
+            pass
+
+    def _rotate(self):
+        self._close_segment()
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{next(_segment_seq):06d}.csv"
+        self._file = open(os.path.join(self.directory, name), "x", newline="", encoding="utf-8")
+        self._file.write(",".join(self.columns) + "\n")
+        self._rows_in_segment = 0
+        if self.fsync != "never":
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            # Garante que a entrada do novo arquivo no diretório também é durável
+            dir_fd = os.open(self.directory, os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+
+    def _close_segment(self):
+        if self._file is None:
+            return
+        self._file.flush()
+        if self.fsync != "never":
+            os.fsync(self._file.fileno())
+        self._file.close()
+        self._file = None
+
+    # --- Leitura ---
+    def segments(self):
+        """Arquivos do log, do mais antigo ao mais recente (o arquivo legado, se existir, vem primeiro)."""
+        files = []
+        if self.legacy_file and os.path.exists(self.legacy_file):
+            files.append(self.legacy_file)
+        if os.path.isdir(self.directory):
+            files.extend(os.path.join(self.directory, f) for f in sorted(os.listdir(self.directory)) if f.endswith(".csv"))
+        return files
+
+    def read(self, limit=None):
+        """Retorna as linhas em ordem cronológica; com `limit`, só as últimas, lendo apenas os segmentos necessários."""
+        if limit is not None and limit <= 0:
+            return []
+        chunks = []
+        total = 0
+        for path in reversed(self.segments()):
+            rows = self._read_segment(path)
+            chunks.append(rows)
+            total += len(rows)
+            if limit is not None and total >= limit:
+                break
+        rows = [row for chunk in reversed(chunks) for row in chunk]
+        return rows[-limit:] if limit is not None else rows
+
+    def _read_segment(self, path):
+        with open(path, newline="", encoding="utf-8") as f:
+            text = f.read()
+        if text and not text.endswith("\n"):
+            text = text[:text.rfind("\n") + 1]  # Linha incompleta de uma gravação interrompida
+        rows = []
+        for row in csv.DictReader(io.StringIO(text)):
+            if None in row or None in row.values():
+                continue  # Linha corrompida
+            rows.append({c: row.get(c) for c in self.columns})
+        return rows
@@ -0,0 +1,211 @@
+import hashlib
+import os
+import secrets
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from src.tracing import span
+from src.utils import get_storage
+
+@dataclass
+class AuthResult:
+    status: str            # "success", "failed" ou "blocked"
+    user: dict = None
+    retry_after: float = 0.0
+
+class TokenBucket:
+    """Limite de taxa por chave: rajada de `capacity` tentativas, repostas a `rate` por segundo."""
+
+    def __init__(self, capacity, rate, max_keys=100_000):
+        self.capacity = capacity
+        self.rate = rate
+        self.max_keys = max_keys
+        self._buckets = {}  # chave -> (fichas, instante da última atualização)
+
+    def take(self, key, now):
+        """Consome uma ficha; retorna (permitido, segundos até a próxima ficha)."""
+        tokens, last = self._buckets.get(key, (self.capacity, now))
+        tokens = min(self.capacity, tokens + (now - last) * self.rate)
+        if tokens < 1:
+            self._buckets[key] = (tokens, now)
+            return False, (1 - tokens) / self.rate
+        self._buckets[key] = (tokens - 1, now)
+        if len(self._buckets) > self.max_keys:
+            self._prune(now)
+        return True, 0.0
+
+    def _prune(self, now):
+        # Baldes já cheios de novo equivalem a não ter entrada
+        full = [k for k, (tokens, last) in self._buckets.items() if tokens + (now - last) * self.rate >= self.capacity]
+        for key in full:
+            del self._buckets[key]
+
+class FailureWindow:
+    """Conta falhas por chave numa janela deslizante de `window` segundos."""
+
+    def __init__(self, window, max_keys=100_000):
+        self.window = window
+        self.max_keys = max_keys
+        self._failures = {}  # chave -> deque de instantes
+
+    def add(self, key, now):
+        failures = self._failures.setdefault(key, deque())
+        failures.append(now)
+        while failures[0] <= now - self.window:
+            failures.popleft()
+        if len(self._failures) > self.max_keys:
+            self._prune(now)
+        return len(failures)
+
+    def _prune(self, now):
+        expired = [k for k, failures in self._failures.items() if failures[-1] <= now - self.window]
+        for key in expired:
+            del self._failures[key]
+
+    def reset(self, key):
+        self._failures.pop(key, None)
+
+class AuthService:
+    """Autenticação por CPF + data de nascimento sem consultar o armazenamento a cada tentativa.
+
+    - Índice em memória com o hash (BLAKE2b com chave aleatória do processo)
+      de cada par CPF+data, recarregado a cada `index_ttl` segundos.
+    - Tentativas erradas ficam num cache negativo por `negative_ttl` segundos
+      e não leem os clientes; um par fora do índice e do cache negativo
+      (cliente novo ou alterado) consulta só aquele CPF (`get_cliente`).
+    - Limite de taxa por sessão (token bucket) e janela deslizante de falhas
+      por CPF e por sessão: `max_failures` falhas em `window` segundos
+      bloqueiam por `lockout` segundos.
+    - Falhas e bloqueios de CPF ficam no armazenamento (`add_falha_auth`,
+      `save_bloqueio`) e valem para qualquer sessão ou processo: cada
+      tentativa confere o bloqueio daquele CPF (`get_bloqueio`). Os de sessão
+      ficam em memória.
+    """
+
+    def __init__(self, max_failures=3, window=900, lockout=900, session_burst=5, session_rate=5 / 60,
+                 index_ttl=300, negative_ttl=60):
+        self.max_failures = max_failures
+        self.window = window
+        self.lockout = lockout
+        self.index_ttl = index_ttl
+        self.negative_ttl = negative_ttl
+
+        self._key = secrets.token_bytes(32)
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._index = {}            # hash(cpf, data) -> cpf
+        self._loaded_from = None    # (id do armazenamento, instante da carga)
+        self._negative = {}         # hash(cpf, data) -> validade
+        self._lockouts = {}         # cpf -> bloqueado até (cópia do armazenamento)
+        self._session_lockouts = {}
+        self._session_bucket = TokenBucket(session_burst, session_rate)
+        self._session_failures = FailureWindow(window)
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_failures=int(os.getenv("AUTH_MAX_FAILURES", 3)),
+            window=float(os.getenv("AUTH_WINDOW", 900)),
+            lockout=float(os.getenv("AUTH_LOCKOUT", 900)),
+            session_burst=int(os.getenv("AUTH_SESSION_BURST", 5)),
+            session_rate=float(os.getenv("AUTH_SESSION_RATE", 5)) / 60,
+            index_ttl=float(os.getenv("AUTH_INDEX_TTL", 300)),
+            negative_ttl=float(os.getenv("AUTH_NEGATIVE_TTL", 60)),
+        )
+
+    def _digest(self, cpf, dob):
+        return hashlib.blake2b(f"{cpf}|{dob}".encode(), key=self._key, digest_size=16).digest()
+
+    def _load(self, now):
+        storage = get_storage()
+        loaded = self._loaded_from
+        if loaded is not None and loaded[0] == id(storage) and now - loaded[1] < self.index_ttl:
+            return
+        with self._load_lock:
+            if self._loaded_from is not loaded:
+                return  # Outra thread acabou de recarregar
+            clientes = storage.list_clientes()
+            index = {
+                self._digest(str(cpf), str(dob)): str(cpf)
+                for cpf, dob in zip(clientes['cpf'], clientes['data_nascimento'])
+            }
+            lockouts = storage.list_bloqueios()
+            with self._lock:
+                self._index = index
+                self._lockouts = {c: u for c, u in self._lockouts.items() if u > now}
+                self._lockouts.update(lockouts)
+                self._negative.clear()
+                self._loaded_from = (id(storage), now)
+
+    def invalidate(self):
+        self._loaded_from = None
+
+    def authenticate(self, cpf, dob, session=None):
+        cpf, dob = str(cpf).strip(), str(dob).strip()
+        now = time.time()
+        with span("auth.authenticate") as auth_span:
+            self._load(now)
+            storage = get_storage()
+            digest = self._digest(cpf, dob)
+            with self._lock:
+                until = max(self._lockouts.get(cpf, 0), self._session_lockouts.get(session, 0))
+                if until > now:
+                    auth_span.set(status="blocked")
+                    return AuthResult("blocked", retry_after=until - now)
+                if session is not None:
+                    allowed, wait = self._session_bucket.take(session, now)
+                    if not allowed:
+                        auth_span.set(status="blocked")
+                        return AuthResult("blocked", retry_after=wait)
+                matched = self._index.get(digest) == cpf
+                negative = self._negative.get(digest, 0) > now
+
+            # Bloqueio gravado por outro processo depois da última carga do índice
+            until = storage.get_bloqueio(cpf)
+            if until > now:
+                self._lock_cpf(cpf, until, now)
+                auth_span.set(status="blocked")
+                return AuthResult("blocked", retry_after=until - now)
+
+            # Par fora do índice (cliente novo ou alterado depois da carga): consulta só este CPF
+            user = storage.get_cliente(cpf) if matched or not negative else None
+            if user is not None and str(user['data_nascimento']) == dob:
+                with self._lock:
+                    self._index[digest] = cpf
+                    self._session_failures.reset(session)
+                storage.clear_falhas_auth(cpf)
+                auth_span.set(status="success")
+                return AuthResult("success", user)
+
+            with self._lock:
+                self._negative[digest] = now + self.negative_ttl
+                if session is not None and self._session_failures.add(session, now) >= self.max_failures:
+                    self._session_lockouts = {s: u for s, u in self._session_lockouts.items() if u > now}
+                    self._session_lockouts[session] = now + self.lockout
+                    self._session_failures.reset(session)
+            # Contagem no armazenamento: falhas em outros processos também contam
+            if storage.add_falha_auth(cpf, now, self.window) >= self.max_failures:
+                storage.save_bloqueio(cpf, now + self.lockout)
+                storage.clear_falhas_auth(cpf)
+                self._lock_cpf(cpf, now + self.lockout, now)
+            auth_span.set(status="failed", negative_cache=negative)
+            return AuthResult("failed")
+
+    def _lock_cpf(self, cpf, until, now):
+        with self._lock:
+            self._lockouts = {c: u for c, u in self._lockouts.items() if u > now}
+            self._lockouts[cpf] = until
+
+# Criado no primeiro uso, e não na importação: assim as variáveis AUTH_* do
+# .env já foram carregadas (load_dotenv em src/agents.py)
+_service = None
+_service_lock = threading.Lock()
+
+def get_auth_service():
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = AuthService.from_env()
+    return _service
@@ -0,0 +1,320 @@
+import asyncio
+import os
+import threading
+import time
+import weakref
+
+DEFAULT_BASE_URL = "http://api.exchangerate.host"
+TARGET_CURRENCY = "BRL"
+
+class ExchangeRateError(Exception):
+    """Erro de cotação com mensagem pronta para ser devolvida ao usuário."""
+
+class ExchangeRateClient:
+    """Cliente do exchangerate.host com cache de cotações por par de moedas.
+
+    - Cotações ficam válidas por `ttl` segundos. Entre `ttl` e `ttl + stale_ttl`
+      a cotação antiga é devolvida na hora e atualizada em segundo plano
+      (stale-while-revalidate); depois disso a busca é síncrona.
+    - As requisições reutilizam conexões de um `requests.Session` com timeout.
+    - Se o plano só permite USD como moeda base (erro 105), a base USD passa
+      a ser usada e pares como EURBRL são derivados de USDBRL / USDEUR.
+
+    A URL base é configurável (EXCHANGERATE_BASE_URL) para apontar o cliente
+    para um servidor local de testes. Os métodos `aget_rate`/`aget_rates` são
+    as versões assíncronas (httpx) e compartilham o mesmo cache.
+    """
+
+    def __init__(self, base_url=None, api_key=None, ttl=None, stale_ttl=None, timeout=None):
+        self.base_url = (base_url or os.getenv("EXCHANGERATE_BASE_URL", DEFAULT_BASE_URL)).rstrip("/")
+        self._api_key = api_key
+        self.ttl = float(ttl if ttl is not None else os.getenv("EXCHANGERATE_TTL", 300))
+        self.stale_ttl = float(stale_ttl if stale_ttl is not None else os.getenv("EXCHANGERATE_STALE_TTL", 600))
+        self.timeout = float(timeout if timeout is not None else os.getenv("EXCHANGERATE_TIMEOUT", 5))
+
+        self._session = None  # requests.Session criada na primeira busca síncrona
+        self._quotes = {}  # par (ex: "USDBRL") -> (cotação, instante da busca)
+        self._lock = threading.Lock()
+        self._fetch_locks = {}
+        self._refreshing = set()
+        self._usd_only = False
+
+        self._async_clients = weakref.WeakKeyDictionary()  # event loop -> httpx.AsyncClient
+        self._inflight = {}
+        self._tasks = set()
+
+    @property
+    def session(self):
+        # requests e httpx só são importados na primeira busca de cada modo
+        if self._session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            with self._lock:
+                if self._session is None:
+                    self._session = session
+        return self._session
+
+    @property
+    def api_key(self):
+        return self._api_key or os.getenv("EXCHANGERATE_API_KEY")
+
+    def clear(self):
+        with self._lock:
+            self._quotes.clear()
+            self._usd_only = False
+
+    def get_rate(self, currency):
+        """Retorna a cotação de `currency` em BRL, usando o cache quando possível."""
+        currency = currency.upper()
+        rates, missing, stale = self._lookup([currency])
+        if stale:
+            self._refresh_in_background(stale)
+        if missing:
+            return self._fetch_pair(currency)
+        return rates[currency]
+
+    def get_rates(self, currencies):
+        """Retorna {moeda: cotação em BRL} para várias moedas com no máximo uma requisição.
+
+        Moedas sem cotação disponível ficam com valor None.
+        """
+        currencies = list(dict.fromkeys(c.upper() for c in currencies))
+        rates, missing, stale = self._lookup(currencies)
+        if missing:
+            # Várias moedas numa única chamada /live (base USD + pares derivados)
+            self._fetch(missing, bulk=True)
+            rates.update(self._from_cache(missing))
+        if stale:
+            self._refresh_in_background(stale)
+        return {c: rates[c] for c in currencies}
+
+    async def aget_rate(self, currency):
+        """Versão assíncrona de get_rate."""
+        currency = currency.upper()
+        rates, missing, stale = self._lookup([currency])
+        if stale:
+            self._arefresh_in_background(stale)
+        if missing:
+            await self._afetch_once(missing)
+            rate = self._from_cache(missing)[currency]
+            if rate is None:
+                raise ExchangeRateError(f"Não foi possível obter a cotação para {currency} em BRL. Verifique se a moeda é válida.")
+            return rate
+        return rates[currency]
+
+    async def aget_rates(self, currencies):
+        """Versão assíncrona de get_rates."""
+        currencies = list(dict.fromkeys(c.upper() for c in currencies))
+        rates, missing, stale = self._lookup(currencies)
+        if missing:
+            await self._afetch_once(missing, bulk=True)
+            rates.update(self._from_cache(missing))
+        if stale:
+            self._arefresh_in_background(stale)
+        return {c: rates[c] for c in currencies}
+
+    def peek(self, currency):
+        """(cotação em BRL, idade em segundos) de `currency` no cache, sem acessar a rede; None se ausente."""
+        currency = currency.upper()
+        if currency == TARGET_CURRENCY:
+            return 1.0, 0.0
+        return self._cached(currency + TARGET_CURRENCY)
+
+    def _lookup(self, currencies):
+        """Separa as moedas em (cotações do cache, ausentes ou expiradas, a revalidar)."""
+        rates, missing, stale = {}, [], []
+        for currency in currencies:
+            if currency == TARGET_CURRENCY:
+                rates[currency] = 1.0
+                continue
+            cached = self._cached(currency + TARGET_CURRENCY)
+            if cached is not None and cached[1] < self.ttl + self.stale_ttl:
+                rates[currency] = cached[0]
+                if cached[1] >= self.ttl:
+                    stale.append(currency)
+            else:
+                missing.append(currency)
+        return rates, missing, stale
+
+    def _from_cache(self, currencies):
+        rates = {}
+        for currency in currencies:
+            cached = self._cached(currency + TARGET_CURRENCY)
+            rates[currency] = cached[0] if cached is not None else None
+        return rates
+
+    def _cached(self, pair):
+        entry = self._quotes.get(pair)
+        if entry is None:
+            return None
+        rate, fetched_at = entry
+        return rate, time.monotonic() - fetched_at
+
+    def _fetch_pair(self, currency):
+        # Single-flight: apenas uma busca por par em andamento
+        pair = currency + TARGET_CURRENCY
+        with self._lock:
+            fetch_lock = self._fetch_locks.setdefault(pair, threading.Lock())
+        with fetch_lock:
+            cached = self._cached(pair)
+            if cached is not None and cached[1] < self.ttl:
+                return cached[0]
+            self._fetch([currency])
+            cached = self._cached(pair)
+            if cached is None:
+                raise ExchangeRateError(f"Não foi possível obter a cotação para {currency} em BRL. Verifique se a moeda é válida.")
+            return cached[0]
+
+    def _refresh_in_background(self, currencies):
+        with self._lock:
+            currencies = [c for c in currencies if c not in self._refreshing]
+            if not currencies:
+                return
+            self._refreshing.update(currencies)
+
+        def refresh():
+            try:
+                self._fetch(currencies)
+            except ExchangeRateError:
+                pass  # Mantém a cotação antiga; a próxima busca síncrona reporta o erro
+            finally:
+                with self._lock:
+                    self._refreshing.difference_update(currencies)
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+    def _fetch(self, currencies, bulk=False):
+        """Busca as cotações de `currencies` em BRL e alimenta o cache.
+
+        Com `bulk=True` (ou mais de uma moeda) faz uma única chamada com base USD.
+        """
+        if self._use_source(currencies, bulk):
+            if self._handle_source_response(currencies[0], self._live(currencies[0], [TARGET_CURRENCY])):
+                return
+        self._handle_usd_response(self._live("USD", self._usd_symbols(currencies)))
+
+    async def _afetch(self, currencies, bulk=False):
+        if self._use_source(currencies, bulk):
+            if self._handle_source_response(currencies[0], await self._alive(currencies[0], [TARGET_CURRENCY])):
+                return
+        self._handle_usd_response(await self._alive("USD", self._usd_symbols(currencies)))
+
+    async def _afetch_once(self, currencies, bulk=False):
+        # Single-flight assíncrono: chamadas concorrentes aguardam a mesma busca
+        key = (id(asyncio.get_running_loop()), tuple(currencies), bulk)
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._afetch(currencies, bulk))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        await asyncio.shield(task)
+
+    def _arefresh_in_background(self, currencies):
+        with self._lock:
+            currencies = [c for c in currencies if c not in self._refreshing]
+            if not currencies:
+                return
+            self._refreshing.update(currencies)
+
+        async def refresh():
+            try:
+                await self._afetch(currencies)
+            except ExchangeRateError:
+                pass  # Mantém a cotação antiga; a próxima busca síncrona reporta o erro
+            finally:
+                with self._lock:
+                    self._refreshing.difference_update(currencies)
+
+        task = asyncio.get_running_loop().create_task(refresh())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _use_source(self, currencies, bulk):
+        return not bulk and len(currencies) == 1 and currencies[0] != "USD" and not self._usd_only
+
+    def _usd_symbols(self, currencies):
+        return [TARGET_CURRENCY] + [c for c in currencies if c not in ("USD", TARGET_CURRENCY)]
+
+    def _handle_source_response(self, currency, data):
+        """Trata a resposta com base na própria moeda; retorna False se for preciso cair para a base USD."""
+        if data.get("success"):
+            self._store(currency, data.get("quotes", {}))
+            return True
+        error = data.get("error", {})
+        if error.get("code") != 105:
+            raise ExchangeRateError(f"Erro na API de câmbio: {error.get('info', 'Erro desconhecido')}")
+        # Plano gratuito: só USD como base. Passa a derivar os pares cruzados.
+        self._usd_only = True
+        return False
+
+    def _handle_usd_response(self, data):
+        if not data.get("success"):
+            error = data.get("error", {})
+            raise ExchangeRateError(f"Erro na API de câmbio: {error.get('info', 'Erro desconhecido')}")
+        self._store("USD", data.get("quotes", {}))
+
+    def _params(self, source, currencies):
+        if not self.api_key:
+            raise ExchangeRateError("Erro de configuração: API Key não encontrada.")
+        return {
+            "access_key": self.api_key,
+            "source": source,
+            "currencies": ",".join(currencies),
+            "format": 1
+        }
+
+    def _live(self, source, currencies):
+        import requests
+        params = self._params(source, currencies)
+        try:
+            response = self.session.get(f"{self.base_url}/live", params=params, timeout=self.timeout)
+            return response.json()
+        except (requests.RequestException, ValueError) as e:
+            raise ExchangeRateError(f"Erro ao conectar com serviço de câmbio: {str(e)}")
+
+    async def _alive(self, source, currencies):
+        import httpx
+        params = self._params(source, currencies)
+        try:
+            response = await self._async_client().get(f"{self.base_url}/live", params=params)
+            return response.json()
+        except (httpx.HTTPError, ValueError) as e:
+            raise ExchangeRateError(f"Erro ao conectar com serviço de câmbio: {str(e)}")
+
+    def _async_client(self):
+        # httpx.AsyncClient fica preso ao event loop em que abriu as conexões
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            import httpx
+            client = httpx.AsyncClient(timeout=self.timeout, limits=httpx.Limits(max_connections=16, max_keepalive_connections=16))
+            self._async_clients[loop] = client
+        return client
+
+    def _store(self, source, quotes):
+        now = time.monotonic()
+        with self._lock:
+            for pair, rate in quotes.items():
+                self._quotes[pair] = (rate, now)
+            # Com base USD, deriva XXXBRL = USDBRL / USDXXX
+            usd_brl = quotes.get("USD" + TARGET_CURRENCY)
+            if source == "USD" and usd_brl:
+                for pair, rate in quotes.items():
+                    currency = pair[3:]
+                    if currency != TARGET_CURRENCY and rate:
+                        self._quotes[currency + TARGET_CURRENCY] = (usd_brl / rate, now)
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_exchange_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = ExchangeRateClient()
+    return _client
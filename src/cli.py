@@ -0,0 +1,28 @@
+import argparse
+from dotenv import load_dotenv
+from src.utils import CLIENTES_FILE, SQLITE_FILE, import_csv_to_sqlite, rescore_clientes_csv
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m src.cli", description="Utilitários de dados do Banco Ágil.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = subparsers.add_parser("import-sqlite", help="Importa os CSVs de data/ para o banco SQLite.")
+    import_parser.add_argument("--db", default=SQLITE_FILE, help="Caminho do arquivo SQLite de destino.")
+
+    rescore_parser = subparsers.add_parser("rescore", help="Recalcula score e limite de todos os clientes em blocos.")
+    rescore_parser.add_argument("--input", default=CLIENTES_FILE, help="CSV de clientes de entrada.")
+    rescore_parser.add_argument("--output", default=None, help="CSV de saída (padrão: sobrescreve a entrada).")
+    rescore_parser.add_argument("--chunksize", type=int, default=100_000, help="Linhas por bloco.")
+
+    args = parser.parse_args(argv)
+    load_dotenv()
+
+    if args.command == "import-sqlite":
+        counts = import_csv_to_sqlite(args.db)
+        print(f"Importação concluída em {args.db}: " + ", ".join(f"{k}={v}" for k, v in counts.items()))
+    elif args.command == "rescore":
+        total = rescore_clientes_csv(args.input, args.output, args.chunksize)
+        print(f"{total} clientes reavaliados.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+import json
+import os
+import threading
+from collections import deque
+from dataclasses import dataclass
+
+def get_text(message):
+    """Extrai o texto de uma mensagem, ignorando blocos que não são texto."""
+    content = message.content
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        text_parts = []
+        for part in content:
+            if isinstance(part, str):
+                text_parts.append(part)
+            elif isinstance(part, dict) and 'text' in part:
+                text_parts.append(part['text'])
+        return "".join(text_parts)
+    return str(content)
+
+def estimate_tokens(message):
+    # Aproximação de ~4 caracteres por token; suficiente para aplicar o orçamento
+    size = len(get_text(message))
+    for call in getattr(message, 'tool_calls', None) or []:
+        size += len(call.get('name', '')) + len(json.dumps(call.get('args', {}), ensure_ascii=False))
+    return size // 4 + 4
+
+@dataclass
+class ContextPolicy:
+    """Política de contexto enviada ao LLM em cada nó.
+
+    - `max_messages`: janela das últimas N mensagens do histórico.
+    - `max_tokens`: orçamento estimado de tokens da janela.
+    - `summarize`: mensagens que saem da janela viram um resumo acumulado no estado.
+    - `summary_max_chars`: tamanho máximo do resumo (mantém a parte mais recente).
+
+    A janela sempre começa numa mensagem do usuário, para nunca separar uma
+    chamada de ferramenta do seu retorno, e sempre inclui o turno atual.
+    """
+    max_messages: int = 20
+    max_tokens: int = 6000
+    summarize: bool = True
+    summary_max_chars: int = 2000
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_messages=int(os.getenv("CONTEXT_MAX_MESSAGES", cls.max_messages)),
+            max_tokens=int(os.getenv("CONTEXT_MAX_TOKENS", cls.max_tokens)),
+            summarize=os.getenv("CONTEXT_SUMMARIZE", "1") not in ("0", "false", "False"),
+            summary_max_chars=int(os.getenv("CONTEXT_SUMMARY_MAX_CHARS", cls.summary_max_chars)),
+        )
+
+def summarize_messages(summary, messages, max_chars):
+    """Acrescenta ao resumo uma linha curta por mensagem (resumo extrativo, sem chamar o LLM)."""
+    lines = [summary] if summary else []
+    for msg in messages:
+        text = " ".join(get_text(msg).split())
+        if msg.type == 'human':
+            lines.append(f"Cliente: {text[:200]}")
+        elif msg.type == 'ai':
+            calls = ", ".join(c['name'] for c in getattr(msg, 'tool_calls', None) or [])
+            if text:
+                lines.append(f"Assistente: {text[:200]}")
+            if calls:
+                lines.append(f"Assistente usou: {calls}")
+        elif msg.type == 'tool':
+            lines.append(f"Resultado de {msg.name}: {text[:200]}")
+    summary = "\n".join(lines)
+    if len(summary) > max_chars:
+        summary = summary[-max_chars:]
+        summary = summary[summary.find("\n") + 1:]
+    return summary
+
+def build_context(state, policy):
+    """Seleciona a janela de mensagens a enviar e atualiza o resumo do histórico antigo.
+
+    Retorna (mensagens da janela, resumo, atualizações do estado).
+    """
+    messages = state['messages']
+    cursor = state.get('summary_cursor', 0)
+    summary = state.get('summary', "")
+
+    human_idx = [i for i, m in enumerate(messages) if m.type == 'human' and i >= cursor]
+    if not human_idx:
+        return messages[cursor:], summary, {}
+    last_human = human_idx[-1]
+
+    # Janela das últimas N mensagens, alinhada ao início de um turno do usuário
+    start = min(max(cursor, len(messages) - policy.max_messages), last_human)
+    start = next(i for i in human_idx if i >= start)
+
+    # Orçamento de tokens: descarta turnos inteiros mais antigos
+    tokens = sum(estimate_tokens(m) for m in messages[start:])
+    for i in human_idx:
+        if i <= start:
+            continue
+        if tokens <= policy.max_tokens:
+            break
+        tokens -= sum(estimate_tokens(m) for m in messages[start:i])
+        start = i
+
+    if start == cursor:
+        return messages[start:], summary, {}
+    if policy.summarize:
+        summary = summarize_messages(summary, messages[cursor:start], policy.summary_max_chars)
+    return messages[start:], summary, {"summary": summary, "summary_cursor": start}
+
+class ContextStats:
+    """Medições por chamada ao LLM: tamanho do histórico, da janela, tokens e latência."""
+
+    def __init__(self, maxlen=500):
+        self._lock = threading.Lock()
+        self._rows = deque(maxlen=maxlen)
+
+    def record(self, agent, history_len, window_len, est_tokens, prompt_tokens, latency):
+        with self._lock:
+            self._rows.append({
+                "agent": agent,
+                "history_len": history_len,
+                "window_len": window_len,
+                "est_tokens": est_tokens,
+                "prompt_tokens": prompt_tokens,
+                "latency_ms": latency * 1000,
+            })
+
+    def rows(self):
+        with self._lock:
+            return list(self._rows)
+
+# Lida no primeiro turno, e não na importação: app.py e src/server.py importam
+# este módulo antes de qualquer load_dotenv, e as variáveis CONTEXT_* do .env
+# seriam ignoradas
+_policy = None
+_policy_lock = threading.Lock()
+
+def get_context_policy():
+    global _policy
+    if _policy is None:
+        with _policy_lock:
+            if _policy is None:
+                _policy = ContextPolicy.from_env()
+    return _policy
+
+context_stats = ContextStats()
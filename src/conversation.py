@@ -0,0 +1,146 @@
+"""Turnos de conversa com o app_graph: no próprio processo ou via servidor HTTP (src/server.py).
+
+A interface Streamlit usa `get_chat()`: com `CHATBOT_API_URL` definida ela é
+só um cliente do servidor; sem a variável, executa o grafo no próprio processo.
+"""
+import json
+import os
+from langchain_core.messages import AIMessage, HumanMessage
+from src.context import context_stats, get_text
+from src.sessions import TURN_DURABILITY, session_config
+from src.tracing import metrics, turn_trace
+
+# Nós cujas mensagens são exibidas ao usuário durante o streaming
+AGENT_NODES = {"triagem", "credito", "entrevista", "cambio", "fastpath"}
+
+# "messages" traz os tokens do LLM; "updates" indica chamadas e retornos de ferramentas
+STREAM_MODES = ["messages", "updates"]
+
+class ServerBusy(Exception):
+    """O servidor recusou o turno por falta de capacidade (HTTP 429 ou 503)."""
+
+    def __init__(self, status, retry_after=None, detail=""):
+        super().__init__(detail or f"Servidor ocupado ({status})")
+        self.status = status
+        self.retry_after = retry_after
+
+def visible_history(messages):
+    """Mensagens exibidas ao usuário: as dele e as respostas finais dos agentes."""
+    rows = []
+    for message in messages:
+        if isinstance(message, HumanMessage):
+            role = "user"
+        elif isinstance(message, AIMessage) and not message.tool_calls:
+            role = "assistant"
+        else:
+            continue
+        content = get_text(message)
+        if content:
+            rows.append({"role": role, "content": content})
+    return rows
+
+def final_reply(messages):
+    last = messages[-1] if messages else None
+    return get_text(last) if isinstance(last, AIMessage) else ""
+
+def stream_events(mode, chunk):
+    """Converte um item de `app_graph.stream(stream_mode=STREAM_MODES)` em eventos para a interface.
+
+    - {"type": "token", "text": ...}: trecho da resposta de um agente;
+    - {"type": "tool_call", "names": [...]}: o texto emitido até aqui será substituído;
+    - {"type": "tool_result", "name": ...}: retorno de uma ferramenta.
+    """
+    if mode == "messages":
+        message, metadata = chunk
+        if metadata.get("langgraph_node") in AGENT_NODES and isinstance(message, AIMessage):
+            text = get_text(message)
+            if text:
+                yield {"type": "token", "text": text}
+        return
+    for node, update in chunk.items():
+        last = (update or {}).get("messages", [None])[-1]
+        if node == "tools":
+            yield {"type": "tool_result", "name": getattr(last, "name", None)}
+        elif getattr(last, "tool_calls", None):
+            yield {"type": "tool_call", "names": [call["name"] for call in last.tool_calls]}
+
+def metrics_snapshot():
+    """Métricas deste processo para os painéis de debug (a mesma forma no modo local e no servidor)."""
+    from src.graph import fast_path_stats
+    from src.response_cache import response_cache
+    traces = metrics.traces()
+    last = traces[-1] if traces else None
+    fast_path = fast_path_stats.snapshot()
+    return {
+        "histograms": metrics.histograms(),
+        "counters": metrics.counters(),
+        "fast_path": fast_path,
+        "response_cache": response_cache.snapshot(fast_path["avg_llm_ms"]),
+        "context": context_stats.rows(),
+        "last_trace": {"id": last.id, "rows": last.rows()} if last else None,
+    }
+
+class LocalChat:
+    """Executa os turnos no próprio processo; o grafo é compilado no primeiro turno (ou histórico) pedido."""
+
+    @property
+    def graph(self):
+        from src.graph import get_app_graph
+        return get_app_graph()
+
+    def history(self, session_id):
+        return visible_history(self.graph.get_state(session_config(session_id)).values.get("messages", []))
+
+    def send(self, session_id, text):
+        with turn_trace(session_id):
+            state = self.graph.invoke({"messages": [HumanMessage(content=text)]}, session_config(session_id), durability=TURN_DURABILITY)
+        return final_reply(state["messages"])
+
+    def stream(self, session_id, text):
+        config = session_config(session_id)
+        with turn_trace(session_id):
+            for mode, chunk in self.graph.stream({"messages": [HumanMessage(content=text)]}, config, stream_mode=STREAM_MODES, durability=TURN_DURABILITY):
+                yield from stream_events(mode, chunk)
+        yield {"type": "done", "reply": final_reply(self.graph.get_state(config).values["messages"])}
+
+    def metrics(self):
+        return metrics_snapshot()
+
+class RemoteChat:
+    """Cliente do servidor de conversas (src/server.py); mesma interface de LocalChat."""
+
+    def __init__(self, base_url, timeout=None):
+        import httpx
+        self.client = httpx.Client(base_url=base_url, timeout=timeout or float(os.getenv("CHATBOT_API_TIMEOUT", 120)))
+
+    def _check(self, response):
+        if response.status_code in (429, 503):
+            response.read()
+            retry_after = response.headers.get("Retry-After")
+            raise ServerBusy(response.status_code, float(retry_after) if retry_after else None, response.json().get("detail", ""))
+        response.raise_for_status()
+        return response
+
+    def history(self, session_id):
+        return self._check(self.client.get(f"/sessions/{session_id}/messages")).json()["messages"]
+
+    def send(self, session_id, text):
+        return self._check(self.client.post(f"/sessions/{session_id}/turns", json={"message": text})).json()["reply"]
+
+    def stream(self, session_id, text):
+        with self.client.stream("POST", f"/sessions/{session_id}/turns/stream", json={"message": text}) as response:
+            self._check(response)
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                event = json.loads(line)
+                if event["type"] == "error":
+                    raise RuntimeError(event["detail"])
+                yield event
+
+    def metrics(self):
+        return self._check(self.client.get("/metrics")).json()
+
+def get_chat():
+    api_url = os.getenv("CHATBOT_API_URL")
+    return RemoteChat(api_url) if api_url else LocalChat()
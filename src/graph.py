@@ -1,13 +1,23 @@
 from typing import TypedDict, Annotated, Literal
-from langgraph.graph import StateGraph, END
-from langgraph.prebuilt import ToolNode
+from langgraph.constants import END
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
+from langchain_core.runnables import RunnableLambda
+import json
+import logging
 import operator
+import threading
+import time
 from src.agents import (
-    llm, 
-    check_auth, get_credit_limit, request_limit_increase, process_interview, get_exchange_rate, end_conversation,
-    TRIAGEM_PROMPT, CREDITO_PROMPT, ENTREVISTA_PROMPT, CAMBIO_PROMPT
+    get_agents,
+    check_auth, get_credit_limit, request_limit_increase, process_interview, get_exchange_rate, get_exchange_rates, end_conversation
 )
+from src.context import build_context, context_stats, estimate_tokens, get_context_policy, get_text
+from src.response_cache import response_cache
+from src.router import normalize, intent_matcher, route_by_keywords, route_by_context, find_currencies
+from src.sessions import create_checkpointer
+from src.tracing import metrics, span, traced
+
+logger = logging.getLogger(__name__)
 
 class AgentState(TypedDict):
     messages: Annotated[list[BaseMessage], operator.add]
@@ -15,163 +25,307 @@ class AgentState(TypedDict):
     authenticated: bool
     current_agent: str
     triagem_attempts: int
+    summary: str          # Resumo das mensagens que saíram da janela de contexto
+    summary_cursor: int   # Quantas mensagens de `messages` já estão no resumo
+
+def get_auth_result(message):
+    """Retorna o usuário autenticado se `message` for um retorno bem-sucedido de check_auth."""
+    if message.type != 'tool' or 'check_auth' not in str(message.name):
+        return None
+    try:
+        result = json.loads(message.content)
+    except (TypeError, ValueError):
+        return None
+    if isinstance(result, dict) and result.get("status") == "success":
+        return result.get("user")
+    return None
+
+class FastPathStats:
+    """Contadores do fast-path: taxa de acerto e latência economizada.
+
+    A economia é estimada como duas chamadas ao LLM (emitir a tool call e
+    redigir a resposta) pela latência média observada, menos o tempo gasto
+    no fast-path.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.turns = 0
+        self.hits = 0
+        self.fast_time = 0.0
+        self.llm_calls = 0
+        self.llm_time = 0.0
+
+    def record_turn(self, hit):
+        with self._lock:
+            self.turns += 1
+            if hit:
+                self.hits += 1
+
+    def record_fast(self, elapsed):
+        with self._lock:
+            self.fast_time += elapsed
+
+    def record_llm(self, elapsed):
+        with self._lock:
+            self.llm_calls += 1
+            self.llm_time += elapsed
+
+    def snapshot(self):
+        with self._lock:
+            avg_llm = self.llm_time / self.llm_calls if self.llm_calls else 0.0
+            avg_fast = self.fast_time / self.hits if self.hits else 0.0
+            return {
+                "turns": self.turns,
+                "hits": self.hits,
+                "hit_rate": self.hits / self.turns if self.turns else 0.0,
+                "avg_fast_ms": avg_fast * 1000,
+                "avg_llm_ms": avg_llm * 1000,
+                "est_saved_ms": max(self.hits * 2 * avg_llm - self.fast_time, 0.0) * 1000,
+            }
+
+fast_path_stats = FastPathStats()
+
+def _record_call(agent, state, messages, window, response, elapsed, call_span):
+    fast_path_stats.record_llm(elapsed)
+    usage = getattr(response, 'usage_metadata', None) or {}
+    prompt_tokens = usage.get('input_tokens')
+    completion_tokens = usage.get('output_tokens')
+    call_span.set(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, window_len=len(window))
+    if usage:
+        metrics.incr(f"llm.{agent}.prompt_tokens", prompt_tokens or 0)
+        metrics.incr(f"llm.{agent}.completion_tokens", completion_tokens or 0)
+    context_stats.record(
+        agent,
+        history_len=len(state['messages']),
+        window_len=len(window),
+        est_tokens=sum(estimate_tokens(m) for m in messages),
+        prompt_tokens=prompt_tokens,
+        latency=elapsed,
+    )
+
+def invoke_agent(agent, state):
+    """Chama o agente registrado com a janela de contexto do estado; retorna (resposta, atualizações do estado).
+
+    Perguntas repetidas dos agentes em RESPONSE_CACHE_AGENTS são respondidas pelo cache de respostas, sem o LLM.
+    """
+    cached = response_cache.lookup(agent, state)
+    if cached is not None:
+        return cached, {}
+    window, summary, updates = build_context(state, get_context_policy())
+    runnable, messages = get_agents()[agent].request(window, summary)
+    with span(f"llm.{agent}", agent=agent) as call_span:
+        start = time.perf_counter()
+        response = runnable.invoke(messages)
+        _record_call(agent, state, messages, window, response, time.perf_counter() - start, call_span)
+    response_cache.store(agent, state, response)
+    return response, updates
+
+async def ainvoke_agent(agent, state):
+    """Versão assíncrona de invoke_agent."""
+    cached = response_cache.lookup(agent, state)
+    if cached is not None:
+        return cached, {}
+    window, summary, updates = build_context(state, get_context_policy())
+    runnable, messages = get_agents()[agent].request(window, summary)
+    with span(f"llm.{agent}", agent=agent) as call_span:
+        start = time.perf_counter()
+        response = await runnable.ainvoke(messages)
+        _record_call(agent, state, messages, window, response, time.perf_counter() - start, call_span)
+    response_cache.store(agent, state, response)
+    return response, updates
 
 # --- Funções dos Nós ---
-def main_router(state: AgentState):
-    # --- DEBUG ---
+# Intenções por objeto de mensagem: route_entry e o nó do fast-path recebem a
+# mesma HumanMessage no turno, então a normalização e o matcher rodam uma vez
+INTENTS_CACHE_SIZE = 256
+_intents_cache = {}  # id(mensagem) -> (mensagem, (texto, intenções))
+_intents_lock = threading.Lock()
+
+def user_intents(state):
+    """Texto normalizado e intenções da última mensagem (uma passada do matcher por mensagem)."""
+    message = state['messages'][-1]
+    cached = _intents_cache.get(id(message))
+    if cached is not None and cached[0] is message:
+        return cached[1]
+    text = normalize(get_text(message))
+    intents = (text, intent_matcher.match(text))
+    with _intents_lock:
+        if len(_intents_cache) >= INTENTS_CACHE_SIZE:
+            del _intents_cache[next(iter(_intents_cache))]  # A mais antiga
+        _intents_cache[id(message)] = (message, intents)
+    return intents
+
+def main_router(state: AgentState, intents=None):
     messages = state['messages']
-    last_user_msg = messages[-1]
-    
-    # Tratamento seguro para a mensagem do usuário (embora geralmente seja string)
-    if isinstance(last_user_msg.content, str):
-        text = last_user_msg.content.lower()
-    else:
-        text = str(last_user_msg.content).lower()
-    
     current = state.get('current_agent', 'triagem')
-    print(f"\n--- ROTEADOR ---")
-    print(f"Agente Atual: {current}")
-    print(f"Texto do Usuário: '{text}'")
 
     # 1. Retorno de Ferramenta (Prioridade Máxima)
     if len(messages) > 1 and messages[-1].type == 'tool':
-        print("DECISÃO: Retorno de ferramenta. Mantendo agente.")
+        logger.debug("Roteador: retorno de ferramenta, mantendo %s", current)
         return current
 
-    # 2. Autenticação
+    # 2. Autenticação (flag persistida pelo triagem_node após check_auth)
     if not state.get('authenticated', False):
-        is_auth = False
-        for msg in messages:
-            if msg.type == 'tool' and 'check_auth' in str(msg.name) and '"status": "success"' in msg.content:
-                is_auth = True
-                break
-        
-        if is_auth:
-            state['authenticated'] = True
-        else:
-            print("DECISÃO: Não autenticado. Indo para Triagem.")
-            return "triagem"
-
-    # 3. Roteamento por Palavras-Chave
-    if any(x in text for x in ["câmbio", "cambio", "dólar", "dolar", "moeda", "cotacao", "cotação", "euro", "converter"]):
-        print("DECISÃO: Palavra-chave de Câmbio detectada -> cambio")
-        return "cambio"
-
-    if any(x in text for x in ["crédito", "credito", "limite", "aumento"]):
-        print("DECISÃO: Palavra-chave de Crédito detectada -> credito")
-        return "credito"
-        
-    if any(x in text for x in ["entrevista", "score", "pontuação", "pontuacao", "renda"]):
-        print("DECISÃO: Palavra-chave de Entrevista detectada -> entrevista")
-        return "entrevista"
-
-    # 4. Checagem de CONTEXTO (Histórico Imediato) - COM CORREÇÃO DE ERRO
-    if len(messages) >= 2:
-        last_ai_msg = messages[-2]
-        
-        if hasattr(last_ai_msg, 'content') and isinstance(last_ai_msg, AIMessage):
-            # --- CORREÇÃO AQUI: Extrair texto de forma segura ---
-            content = last_ai_msg.content
-            last_ai_text = ""
-            
-            if isinstance(content, str):
-                last_ai_text = content.lower()
-            elif isinstance(content, list):
-                # Se for lista, junta as partes de texto e ignora as partes de ferramenta
-                text_parts = []
-                for part in content:
-                    if isinstance(part, str):
-                        text_parts.append(part)
-                    elif isinstance(part, dict) and 'text' in part:
-                        text_parts.append(part['text'])
-                last_ai_text = "".join(text_parts).lower()
-            # ----------------------------------------------------
-            
-            print(f"   (Contexto Anterior IA: '{last_ai_text[:50]}...')")
+        logger.debug("Roteador: não autenticado -> triagem")
+        return "triagem"
 
-            agreement_words = ["sim", "claro", "quero", "pode ser", "ok", "com certeza", "gostaria", "para"]
-            
-            # Verifica se o usuário concordou ou deu um valor (ex: "para 2000")
-            user_agreed = any(w in text for w in agreement_words) or any(char.isdigit() for char in text)
-
-            if user_agreed:
-                if "câmbio" in last_ai_text or "moeda" in last_ai_text:
-                    print("DECISÃO: Contexto (Bot ofereceu Câmbio) -> cambio")
-                    return "cambio"
-                
-                if "entrevista" in last_ai_text or "score" in last_ai_text:
-                    print("DECISÃO: Contexto (Bot ofereceu Entrevista) -> entrevista")
-                    return "entrevista"
-                
-                # Contexto específico para crédito (ex: "para 2000")
-                if "limite" in last_ai_text or "aumento" in last_ai_text or "r$" in last_ai_text:
-                     print("DECISÃO: Contexto (Assunto de Crédito) -> credito")
-                     return "credito"
+    text, hits = intents or user_intents(state)
+
+    # 3. Roteamento por Palavras-Chave (regras em src/router.py)
+    agent = route_by_keywords(hits)
+    if agent:
+        logger.debug("Roteador: palavra-chave em %r -> %s", text, agent)
+        return agent
+
+    # 4. Contexto: concordância ou valor em resposta à oferta anterior da IA
+    if len(messages) >= 2 and isinstance(messages[-2], AIMessage):
+        agent = route_by_context(hits, get_text(messages[-2]))
+        if agent:
+            logger.debug("Roteador: contexto da última mensagem da IA -> %s", agent)
+            return agent
 
     # 5. Fallback
-    print(f"DECISÃO: Nenhuma mudança detectada. Mantendo: {current}")
+    logger.debug("Roteador: nenhuma mudança detectada, mantendo %s", current)
     return current
 
-def triagem_node(state: AgentState):
+def _triagem_checks(state):
+    """Conta tentativas falhas e detecta autenticação; retorna (tentativas, atualização, resposta de bloqueio)."""
     messages = state['messages']
     current_attempts = state.get('triagem_attempts', 0)
+    auth_update = {}
     
     if len(messages) > 0 and messages[-1].type == 'tool' and 'check_auth' in str(messages[-1].name):
         if '"status": "failed"' in messages[-1].content:
             current_attempts += 1
+        user = get_auth_result(messages[-1])
+        if user:
+            # Persiste a autenticação no estado para os demais agentes
+            auth_update = {"authenticated": True, "cpf": str(user["cpf"])}
             
     if current_attempts >= 3:
-        return {
+        return current_attempts, auth_update, {
             "messages": [AIMessage(content="Número máximo de tentativas excedido.")],
             "triagem_attempts": current_attempts,
             "current_agent": "triagem"
         }
+    return current_attempts, auth_update, None
 
-    response = llm.bind_tools([check_auth, end_conversation]).invoke(
-        [{"role": "system", "content": TRIAGEM_PROMPT}] + messages
-    )
-    return {"messages": [response], "current_agent": "triagem", "triagem_attempts": current_attempts}
+def triagem_node(state: AgentState):
+    current_attempts, auth_update, blocked = _triagem_checks(state)
+    if blocked:
+        return blocked
+    response, context_update = invoke_agent("triagem", state)
+    return {"messages": [response], "current_agent": "triagem", "triagem_attempts": current_attempts, **auth_update, **context_update}
+
+async def atriagem_node(state: AgentState):
+    current_attempts, auth_update, blocked = _triagem_checks(state)
+    if blocked:
+        return blocked
+    response, context_update = await ainvoke_agent("triagem", state)
+    return {"messages": [response], "current_agent": "triagem", "triagem_attempts": current_attempts, **auth_update, **context_update}
 
 def credito_node(state: AgentState):
-    response = llm.bind_tools([get_credit_limit, request_limit_increase, end_conversation]).invoke(
-        [{"role": "system", "content": CREDITO_PROMPT}] + state['messages']
-    )
-    return {"messages": [response], "current_agent": "credito"}
+    response, context_update = invoke_agent("credito", state)
+    return {"messages": [response], "current_agent": "credito", **context_update}
+
+async def acredito_node(state: AgentState):
+    response, context_update = await ainvoke_agent("credito", state)
+    return {"messages": [response], "current_agent": "credito", **context_update}
 
 def entrevista_node(state: AgentState):
-    response = llm.bind_tools([process_interview, end_conversation]).invoke(
-        [{"role": "system", "content": ENTREVISTA_PROMPT}] + state['messages']
-    )
-    return {"messages": [response], "current_agent": "entrevista"}
+    response, context_update = invoke_agent("entrevista", state)
+    return {"messages": [response], "current_agent": "entrevista", **context_update}
+
+async def aentrevista_node(state: AgentState):
+    response, context_update = await ainvoke_agent("entrevista", state)
+    return {"messages": [response], "current_agent": "entrevista", **context_update}
 
 def cambio_node(state: AgentState):
-    response = llm.bind_tools([get_exchange_rate, end_conversation]).invoke(
-        [{"role": "system", "content": CAMBIO_PROMPT}] + state['messages']
-    )
-    return {"messages": [response], "current_agent": "cambio"}
+    response, context_update = invoke_agent("cambio", state)
+    return {"messages": [response], "current_agent": "cambio", **context_update}
 
-# --- Construção do Grafo ---
+async def acambio_node(state: AgentState):
+    response, context_update = await ainvoke_agent("cambio", state)
+    return {"messages": [response], "current_agent": "cambio", **context_update}
+
+# --- Fast-path (respostas determinísticas sem LLM) ---
+def match_fast_path(state, intents=None):
+    """Identifica turnos de pura consulta que podem ser respondidos sem o LLM.
+
+    Retorna (agente, intenção, argumentos) ou None quando não há confiança suficiente.
+    """
+    messages = state['messages']
+    if not state.get('authenticated') or not state.get('cpf') or messages[-1].type != 'human':
+        return None
+    text, hits = intents or user_intents(state)
+    if "valor" in hits:
+        return None  # Valores na mensagem exigem interpretação do LLM
+
+    # Mesma precedência do main_router: câmbio antes de crédito
+    currencies = find_currencies(text) if "moeda_citada" in hits else []
+    if "cambio" in hits or currencies:
+        if "acao_cambio" in hits or not currencies:
+            return None
+        return "cambio", "cotacao", {"currencies": currencies}
+
+    if "limite" in hits and "consulta_limite" in hits and "acao_limite" not in hits:
+        return "credito", "limite", {"cpf": state['cpf']}
+    return None
+
+FAST_PATH_TOOLS = {"limite": get_credit_limit, "cotacao": get_exchange_rates}
+
+def _fast_path_reply(agent, intent, result, elapsed):
+    if intent == "cotacao":
+        if "Erro" in result:
+            # Deixa o agente de câmbio tratar o erro
+            return {"current_agent": agent}
+        reply = f"{result}\n\nDeseja ver outra moeda ou precisa de mais alguma ajuda?"
+    else:
+        if not result.startswith("Seu limite atual"):
+            # Erro da ferramenta (ex: "Usuário não encontrado."): o agente de crédito responde
+            return {"current_agent": agent}
+        reply = f"{result}. Posso ajudar com mais alguma coisa?"
+    fast_path_stats.record_fast(elapsed)
+    return {"messages": [AIMessage(content=reply)], "current_agent": agent}
+
+def fast_path_node(state: AgentState):
+    match = match_fast_path(state)
+    if match is None:
+        return {}
+    agent, intent, args = match
+    start = time.perf_counter()
+    result = FAST_PATH_TOOLS[intent].invoke(args)
+    return _fast_path_reply(agent, intent, result, time.perf_counter() - start)
+
+async def afast_path_node(state: AgentState):
+    match = match_fast_path(state)
+    if match is None:
+        return {}
+    agent, intent, args = match
+    start = time.perf_counter()
+    result = await FAST_PATH_TOOLS[intent].ainvoke(args)
+    return _fast_path_reply(agent, intent, result, time.perf_counter() - start)
 
-workflow_router = StateGraph(AgentState)
+# --- Construção do Grafo ---
 
-workflow_router.add_node("triagem", triagem_node)
-workflow_router.add_node("credito", credito_node)
-workflow_router.add_node("entrevista", entrevista_node)
-workflow_router.add_node("cambio", cambio_node)
-workflow_router.add_node("tools", ToolNode([check_auth, get_credit_limit, request_limit_increase, process_interview, get_exchange_rate, end_conversation]))
+def node(name, func, afunc):
+    """Nó com versão síncrona (invoke/stream) e assíncrona (ainvoke/astream), medido pelo span `node.<nome>`."""
+    return RunnableLambda(traced(f"node.{name}")(func), afunc=traced(f"node.{name}")(afunc))
 
 def route_entry(state):
-    return main_router(state)
-
-workflow_router.set_conditional_entry_point(
-    route_entry,
-    {
-        "triagem": "triagem",
-        "credito": "credito",
-        "entrevista": "entrevista",
-        "cambio": "cambio"
-    }
-)
+    with span("router") as router_span:
+        if state['messages'][-1].type != 'human':
+            route = main_router(state)
+        else:
+            intents = user_intents(state)
+            agent = main_router(state, intents)
+            match = match_fast_path(state, intents)
+            hit = match is not None and match[0] == agent
+            fast_path_stats.record_turn(hit)
+            route = "fastpath" if hit else agent
+        router_span.set(route=route)
+    return route
 
 def agent_router(state):
     last_message = state['messages'][-1]
@@ -179,14 +333,64 @@ def agent_router(state):
         return "tools"
     return END
 
-workflow_router.add_conditional_edges("triagem", agent_router)
-workflow_router.add_conditional_edges("credito", agent_router)
-workflow_router.add_conditional_edges("entrevista", agent_router)
-workflow_router.add_conditional_edges("cambio", agent_router)
-
 def tool_router(state):
     return state.get('current_agent', 'triagem')
 
-workflow_router.add_conditional_edges("tools", tool_router)
+def fast_path_router(state):
+    if isinstance(state['messages'][-1], AIMessage):
+        return END
+    return state.get('current_agent', 'triagem')
+
+def build_graph(checkpointer=None):
+    """Monta e compila o grafo; sem `checkpointer`, usa o de src/sessions.py."""
+    # langgraph.graph e langgraph.prebuilt custam quase 1 s de importação: só aqui
+    from langgraph.graph import StateGraph
+    from langgraph.prebuilt import ToolNode
+
+    workflow_router = StateGraph(AgentState)
+
+    workflow_router.add_node("triagem", node("triagem", triagem_node, atriagem_node))
+    workflow_router.add_node("credito", node("credito", credito_node, acredito_node))
+    workflow_router.add_node("entrevista", node("entrevista", entrevista_node, aentrevista_node))
+    workflow_router.add_node("cambio", node("cambio", cambio_node, acambio_node))
+    workflow_router.add_node("fastpath", node("fastpath", fast_path_node, afast_path_node))
+    workflow_router.add_node("tools", ToolNode([check_auth, get_credit_limit, request_limit_increase, process_interview, get_exchange_rate, get_exchange_rates, end_conversation]))
+
+    workflow_router.set_conditional_entry_point(
+        route_entry,
+        {
+            "triagem": "triagem",
+            "credito": "credito",
+            "entrevista": "entrevista",
+            "cambio": "cambio",
+            "fastpath": "fastpath"
+        }
+    )
+
+    workflow_router.add_conditional_edges("triagem", agent_router)
+    workflow_router.add_conditional_edges("credito", agent_router)
+    workflow_router.add_conditional_edges("entrevista", agent_router)
+    workflow_router.add_conditional_edges("cambio", agent_router)
+    workflow_router.add_conditional_edges("tools", tool_router)
+    workflow_router.add_conditional_edges("fastpath", fast_path_router)
+
+    # Estado das sessões persistido por thread_id (ver src/sessions.py)
+    return workflow_router.compile(checkpointer=checkpointer or create_checkpointer())
+
+_app_graph = None
+_app_graph_lock = threading.Lock()
+
+def get_app_graph():
+    """Grafo compartilhado do processo, compilado no primeiro uso."""
+    global _app_graph
+    with _app_graph_lock:
+        if _app_graph is None:
+            with span("startup.build_graph"):
+                _app_graph = build_graph()
+        return _app_graph
 
-app_graph = workflow_router.compile()
\ No newline at end of file
+def __getattr__(name):
+    # `from src.graph import app_graph` continua funcionando (compila o grafo nesse momento)
+    if name == "app_graph":
+        return get_app_graph()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,143 @@
+"""Travas por linha (CPF) entre threads e entre processos."""
+import errno
+import os
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+class KeyedLock:
+    """Um Lock por chave, criado sob demanda e descartado quando ninguém mais o usa."""
+
+    def __init__(self):
+        self._mutex = threading.Lock()
+        self._locks = {}  # chave -> [lock, threads usando ou aguardando]
+
+    @contextmanager
+    def hold(self, key):
+        with self._mutex:
+            entry = self._locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._mutex:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._locks[key]
+
+class FileRangeLock:
+    """Travas entre processos sobre bytes de um único arquivo (fcntl.lockf ou msvcrt.locking).
+
+    Cada slot é um byte do arquivo, então slots diferentes não se bloqueiam.
+    Essas travas pertencem ao processo, não à thread, e fechar qualquer
+    descritor do arquivo libera todas elas: o descritor fica aberto durante
+    toda a vida do objeto e deve haver um único objeto por arquivo (`row_locks`).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+        self._fd_lock = threading.Lock()
+
+    def _open(self):
+        with self._fd_lock:
+            if self._fd is None:
+                self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            return self._fd
+
+    @contextmanager
+    def hold(self, slot):
+        fd = self._open()
+        self._acquire(fd, slot)
+        try:
+            yield
+        finally:
+            self._release(fd, slot)
+
+    if os.name == "nt":
+        def _acquire(self, fd, slot):
+            while True:
+                # msvcrt trava a partir da posição atual, compartilhada entre threads
+                with self._fd_lock:
+                    os.lseek(fd, slot, os.SEEK_SET)
+                    try:
+                        msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+                        return
+                    except OSError:
+                        pass
+                time.sleep(0.005)
+
+        def _release(self, fd, slot):
+            with self._fd_lock:
+                os.lseek(fd, slot, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+    else:
+        def _acquire(self, fd, slot):
+            while True:
+                try:
+                    fcntl.lockf(fd, fcntl.LOCK_EX, 1, slot)
+                    return
+                except OSError as e:
+                    # O kernel detecta deadlock por processo, não por thread: outra
+                    # thread deste processo esperando um slot do processo dono deste
+                    # gera um falso positivo. A ordem das travas (CPF antes do
+                    # arquivo inteiro) é fixa, então basta tentar de novo.
+                    if e.errno != errno.EDEADLK:
+                        raise
+                    time.sleep(0.001)
+
+        def _release(self, fd, slot):
+            fcntl.lockf(fd, fcntl.LOCK_UN, 1, slot)
+
+class RowLocks:
+    """Trava exclusiva por chave (CPF), válida entre threads e entre processos.
+
+    A chave é mapeada para um de `slots` bytes do arquivo de trava (CPFs
+    diferentes raramente dividem um slot) e o slot é travado primeiro entre
+    as threads do processo e depois no arquivo. O slot 0 (`hold_all`) é
+    reservado para operações sobre o arquivo inteiro, como reescrever o CSV.
+    """
+
+    def __init__(self, path, slots=4096):
+        self.path = path
+        self.slots = slots
+        self._threads = KeyedLock()
+        self._file = FileRangeLock(path)
+
+    def slot(self, key):
+        return 1 + zlib.crc32(str(key).encode()) % self.slots
+
+    @contextmanager
+    def hold(self, key):
+        with self._hold_slot(self.slot(key)):
+            yield
+
+    @contextmanager
+    def hold_all(self):
+        with self._hold_slot(0):
+            yield
+
+    @contextmanager
+    def _hold_slot(self, slot):
+        # Por slot, não por chave: duas chaves do mesmo slot no mesmo processo
+        # não podem entrar juntas, senão a primeira a sair destravaria o byte da outra
+        with self._threads.hold(slot), self._file.hold(slot):
+            yield
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+def row_locks(path):
+    """RowLocks compartilhado do arquivo de trava `path` (um único por arquivo no processo)."""
+    path = os.path.abspath(path)
+    with _registry_lock:
+        if path not in _registry:
+            _registry[path] = RowLocks(path)
+        return _registry[path]
@@ -0,0 +1,236 @@
+import os
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from langchain_core.messages import AIMessage
+from src.cambio import get_exchange_client
+from src.context import get_text
+from src.router import find_currencies, intent_matcher, normalize
+from src.tracing import metrics, span
+
+WORD_REGEX = re.compile(r"[a-z0-9]+")
+NUMBER_REGEX = re.compile(r"\d+(?:[.,]\d+)*")
+
+# Ferramentas cujo resultado depende só das cotações, e não do cliente
+QUOTE_TOOLS = {"get_exchange_rate", "get_exchange_rates"}
+
+# Perguntas sem moeda nem um destes assuntos ("sim", "pode ser", "e quanto dá?")
+# dependem do que veio antes na conversa e não entram no cache
+TOPIC_INTENTS = {"cambio", "credito", "entrevista", "limite"}
+
+EMBEDDING_DIMS = 512
+
+@dataclass
+class CacheEntry:
+    content: str
+    quotes: dict        # moeda -> cotação usada na resposta
+    expires_at: float
+    llm_calls: int      # chamadas ao LLM que a resposta custou (evitadas a cada acerto)
+    vector: object = None
+
+def question_key(text):
+    """Texto normalizado (só palavras) e assinatura da pergunta: moedas, números e intenções.
+
+    Perguntas com assinaturas diferentes nunca compartilham resposta, nem na
+    busca por similaridade: "converter 100 dólares" e "converter 200 dólares"
+    são parecidas no texto, mas não na assinatura.
+    """
+    normalized = normalize(text)
+    signature = (
+        tuple(sorted(find_currencies(normalized))),
+        tuple(NUMBER_REGEX.findall(normalized)),
+        tuple(sorted(intent_matcher.match(normalized))),
+    )
+    return " ".join(WORD_REGEX.findall(normalized)), signature
+
+def embed(text):
+    """Vetor local (sem rede) dos trigramas de caracteres do texto, por hashing, com norma 1."""
+    import numpy as np  # Só com RESPONSE_CACHE_SEMANTIC=1
+    vector = np.zeros(EMBEDDING_DIMS, dtype=np.float32)
+    padded = f" {text} "
+    for i in range(len(padded) - 2):
+        vector[zlib.crc32(padded[i:i + 3].encode()) % EMBEDDING_DIMS] += 1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+class ResponseCache:
+    """Respostas finais dos agentes reaproveitadas para perguntas equivalentes, sem chamar o LLM.
+
+    - Só entram turnos de `agents` que consultaram cotações e nenhuma outra
+      ferramenta, com perguntas autossuficientes: pelo menos duas palavras e
+      uma moeda ou um assunto (TOPIC_INTENTS) citado. A chave não tem o CPF:
+      respostas sem ferramenta saem do histórico do cliente (dados do
+      check_auth, resumo) e não podem ser servidas a outro cliente.
+    - A chave é o agente, o status de autenticação, a assinatura e o texto
+      normalizado da pergunta. Com `semantic`, uma pergunta sem chave exata
+      usa a resposta mais parecida (cosseno dos trigramas >= `similarity`)
+      entre as de mesma assinatura.
+    - Uma resposta vale enquanto as mesmas cotações estiverem frescas no
+      cache do cliente de câmbio, por no máximo `ttl` segundos.
+    """
+
+    def __init__(self, enabled=True, agents=("cambio",), ttl=3600, max_entries=1024, semantic=False, similarity=0.8):
+        self.enabled = enabled
+        self.agents = set(agents)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.semantic = semantic
+        self.similarity = similarity
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # chave -> CacheEntry, da menos para a mais usada
+        self._buckets = {}             # chave sem o texto -> chaves (busca por similaridade)
+        self.lookups = 0
+        self.hits = 0
+        self.semantic_hits = 0
+        self.llm_calls_saved = 0
+        self.lookup_time = 0.0
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            enabled=os.getenv("RESPONSE_CACHE", "1") == "1",
+            agents=[a.strip() for a in os.getenv("RESPONSE_CACHE_AGENTS", "cambio").split(",") if a.strip()],
+            ttl=float(os.getenv("RESPONSE_CACHE_TTL", 3600)),
+            max_entries=int(os.getenv("RESPONSE_CACHE_MAX", 1024)),
+            semantic=os.getenv("RESPONSE_CACHE_SEMANTIC", "0") == "1",
+            similarity=float(os.getenv("RESPONSE_CACHE_SIMILARITY", 0.8)),
+        )
+
+    def _turn(self, state):
+        """Última mensagem do usuário e as mensagens do turno depois dela."""
+        messages = state['messages']
+        for i in range(len(messages) - 1, -1, -1):
+            if messages[i].type == 'human':
+                return messages[i], messages[i + 1:]
+        return None, []
+
+    def _key(self, agent, state, human):
+        text, signature = question_key(get_text(human))
+        currencies, _, intents = signature
+        if len(text.split()) < 2 or not (currencies or TOPIC_INTENTS & set(intents)):
+            return None
+        return (agent, bool(state.get('authenticated')), signature, text)
+
+    def lookup(self, agent, state):
+        """Resposta em cache para a pergunta que abre o turno, ou None."""
+        if not self.enabled or agent not in self.agents:
+            return None
+        human, turn = self._turn(state)
+        if human is None or turn:
+            return None  # Só antes da primeira chamada ao LLM do turno
+        start = time.perf_counter()
+        with span("response_cache.lookup", agent=agent) as lookup_span:
+            key = self._key(agent, state, human)
+            entry, semantic = None, False
+            if key is not None:
+                vector = embed(key[3]) if self.semantic else None
+                with self._lock:
+                    entry = self._get(key)
+                    if entry is None and vector is not None:
+                        entry = self._get_similar(key, vector)
+                        semantic = entry is not None
+            lookup_span.set(hit=entry is not None, semantic=semantic)
+        with self._lock:
+            self.lookups += 1
+            self.lookup_time += time.perf_counter() - start
+            if entry is not None:
+                self.hits += 1
+                self.semantic_hits += semantic
+                self.llm_calls_saved += entry.llm_calls
+        metrics.incr("response_cache.hit" if entry is not None else "response_cache.miss")
+        return AIMessage(content=entry.content) if entry is not None else None
+
+    def store(self, agent, state, response):
+        """Guarda a resposta final do turno, se ela depender só da pergunta e das cotações consultadas."""
+        if not self.enabled or agent not in self.agents or response.tool_calls:
+            return
+        human, turn = self._turn(state)
+        content = get_text(response)
+        if human is None or not content:
+            return
+        key = self._key(agent, state, human)
+        if key is None:
+            return
+        client = get_exchange_client()
+        quotes = {}
+        for message in turn:
+            for call in getattr(message, 'tool_calls', None) or []:
+                if call['name'] not in QUOTE_TOOLS:
+                    return
+                currencies = call['args'].get('currencies') or [call['args'].get('currency', 'USD')]
+                for currency in currencies:
+                    cached = client.peek(currency)
+                    if cached is None:
+                        return  # Cotação não obtida: a resposta fala de um erro
+                    quotes[currency.upper()] = cached[0]
+        if not quotes:
+            return  # Sem cotação, a resposta veio do histórico deste cliente
+        llm_calls = 1 + sum(1 for m in turn if m.type == 'ai')
+        entry = CacheEntry(content, quotes, time.monotonic() + self.ttl, llm_calls, embed(key[3]) if self.semantic else None)
+        with self._lock:
+            if key not in self._entries:
+                self._buckets.setdefault(key[:3], set()).add(key)
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def _valid(self, entry):
+        if time.monotonic() >= entry.expires_at:
+            return False
+        client = get_exchange_client()
+        for currency, rate in entry.quotes.items():
+            cached = client.peek(currency)
+            if cached is None or cached[1] >= client.ttl or cached[0] != rate:
+                return False
+        return True
+
+    def _get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if not self._valid(entry):
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _get_similar(self, key, vector):
+        import numpy as np
+        best, best_score = None, self.similarity
+        for candidate in list(self._buckets.get(key[:3], ())):
+            score = float(np.dot(vector, self._entries[candidate].vector))
+            if score >= best_score:
+                best, best_score = candidate, score
+        return self._get(best) if best is not None else None
+
+    def _remove(self, key):
+        del self._entries[key]
+        bucket = self._buckets[key[:3]]
+        bucket.discard(key)
+        if not bucket:
+            del self._buckets[key[:3]]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+
+    def snapshot(self, avg_llm_ms=0.0):
+        """Taxa de acerto e latência economizada (chamadas evitadas x latência média do LLM, menos as consultas)."""
+        with self._lock:
+            return {
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "hit_rate": self.hits / self.lookups if self.lookups else 0.0,
+                "entries": len(self._entries),
+                "avg_lookup_ms": self.lookup_time / self.lookups * 1000 if self.lookups else 0.0,
+                "est_saved_ms": max(self.llm_calls_saved * avg_llm_ms - self.lookup_time * 1000, 0.0),
+            }
+
+response_cache = ResponseCache.from_env()
@@ -0,0 +1,156 @@
+import re
+import unicodedata
+
+def normalize(text):
+    """Minúsculas e sem acentos ("Cotação" -> "cotacao")."""
+    text = text.lower()
+    if text.isascii():
+        return text
+    return unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
+
+def trie_pattern(words):
+    """Regex equivalente à alternância de `words`, fatorada por prefixos comuns.
+
+    O `re` testa cada alternativa em sequência; com os prefixos fatorados
+    ("aument|aumento" -> "aument(?:o)?") cada posição do texto é descartada
+    com um único teste do primeiro caractere.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node):
+        end = "" in node
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        if len(branches) == 1 and not end:
+            return branches[0]
+        group = "(?:" + "|".join(branches) + ")"
+        # Mais longa primeiro: o "?" guloso prefere continuar a palavra
+        return group + "?" if end else group
+
+    return build(trie)
+
+class IntentMatcher:
+    """Casa todas as palavras-chave de uma tabela {intenção: [palavras]} numa única passada.
+
+    As palavras são normalizadas (sem acento) e compiladas numa só regex
+    fatorada por prefixos, que prefere sempre a palavra mais longa. Cada palavra casada também conta as
+    intenções das palavras contidas nela ("meu limite" -> consulta_limite e
+    limite), então a varredura sem sobreposição não perde intenções.
+    Com `digits=True`, dígitos geram a intenção `valor` (ex: "para 2000").
+    """
+
+    def __init__(self, table, digits=False):
+        intents_of = {}
+        for intent, keywords in table.items():
+            for keyword in keywords:
+                intents_of.setdefault(normalize(keyword), set()).add(intent)
+        self._intents_of = {
+            keyword: frozenset().union(*(intents for other, intents in intents_of.items() if other in keyword))
+            for keyword in intents_of
+        }
+        pattern = trie_pattern(intents_of)
+        if digits:
+            pattern += r"|\d"
+            self._intents_of.update({str(d): frozenset({"valor"}) for d in range(10)})
+        self._regex = re.compile(pattern)
+
+    def match(self, text):
+        """Retorna o conjunto de intenções presentes em `text` (já normalizado)."""
+        hits = set()
+        for token in set(self._regex.findall(text)):
+            hits |= self._intents_of[token]
+        return hits
+
+# --- Tabelas de Palavras-Chave ---
+# Consulta do limite: o verbo precisa vir junto do substantivo ("qual é o meu
+# limite"); "qual" ou "quanto" soltos também aparecem em pedidos como "qual o
+# limite máximo que consigo?"
+LIMITE_CONSULTAS = [
+    f"{verbo} {artigo}limite"
+    for verbo in ("qual", "qual e", "quanto", "quanto e", "quanto de", "quanto tenho de", "consultar", "ver", "mostrar", "mostra")
+    for artigo in ("", "o ", "meu ", "o meu ")
+] + ["meu limite", "limite atual"]
+
+INTENT_KEYWORDS = {
+    "cambio": ["câmbio", "dólar", "moeda", "cotação", "euro", "converter"],
+    "credito": ["crédito", "limite", "aumento"],
+    "entrevista": ["entrevista", "score", "pontuação", "renda"],
+    "concordancia": ["sim", "claro", "quero", "pode ser", "ok", "com certeza", "gostaria", "para"],
+    # Usadas pelo fast-path
+    "limite": ["limite"],
+    "consulta_limite": LIMITE_CONSULTAS,
+    # Pedidos e perguntas sobre outro limite que não o atual ("máximo", "consigo")
+    "acao_limite": ["aument", "solicit", "pedi", "subir", "mudar", "alterar", "diminu", "reduz", "entrevista", "score",
+                    "maxim", "consig", "posso", "poderia", "mais"],
+    "acao_cambio": ["converter", "conversão", "trocar", "comprar", "vender"],
+    # Pré-filtro de moedas; a extração usa MOEDAS_REGEX (códigos como palavras inteiras)
+    "moeda_citada": ["dolar", "usd", "euro", "eur", "libra", "gbp", "iene", "jpy", "peso argentino", "ars"],
+}
+
+# Assuntos reconhecidos na última mensagem da IA (para respostas curtas como "sim")
+CONTEXT_KEYWORDS = {
+    "cambio": ["câmbio", "moeda"],
+    "entrevista": ["entrevista", "score"],
+    "credito": ["limite", "aumento", "r$"],
+}
+
+# --- Regras de Roteamento (em ordem de prioridade) ---
+# Palavra-chave na mensagem do usuário -> agente
+KEYWORD_ROUTES = [
+    ("cambio", "cambio"),
+    ("credito", "credito"),
+    ("entrevista", "entrevista"),
+]
+# Intenções que indicam concordância ou um valor em resposta à oferta anterior da IA
+CONTEXT_TRIGGERS = {"concordancia", "valor"}
+# Assunto da última mensagem da IA -> agente
+CONTEXT_ROUTES = [
+    ("cambio", "cambio"),
+    ("entrevista", "entrevista"),
+    ("credito", "credito"),
+]
+
+MOEDAS = {
+    "dolar": "USD", "usd": "USD",
+    "euro": "EUR", "eur": "EUR",
+    "libra": "GBP", "gbp": "GBP",
+    "iene": "JPY", "jpy": "JPY",
+    "peso argentino": "ARS", "ars": "ARS",
+}
+# Nomes aceitam plural ("dólares"); códigos de 3 letras precisam ser palavras inteiras
+MOEDAS_REGEX = re.compile(
+    r"\b(" + "|".join(sorted((m for m in MOEDAS if len(m) > 3), key=len, reverse=True))
+    + r"|(?:" + "|".join(m for m in MOEDAS if len(m) == 3) + r")\b)"
+)
+
+intent_matcher = IntentMatcher(INTENT_KEYWORDS, digits=True)
+context_matcher = IntentMatcher(CONTEXT_KEYWORDS)
+
+def match_intents(text):
+    return intent_matcher.match(normalize(text))
+
+def route_by_keywords(hits):
+    for intent, agent in KEYWORD_ROUTES:
+        if intent in hits:
+            return agent
+    return None
+
+def route_by_context(hits, previous_ai_text):
+    """Roteia respostas curtas ("sim", "para 2000") pelo assunto da última mensagem da IA."""
+    if not hits & CONTEXT_TRIGGERS or not previous_ai_text:
+        return None
+    topics = context_matcher.match(normalize(previous_ai_text))
+    for intent, agent in CONTEXT_ROUTES:
+        if intent in topics:
+            return agent
+    return None
+
+def find_currencies(text):
+    """Códigos das moedas citadas em `text` (já normalizado), na ordem em que aparecem."""
+    return list(dict.fromkeys(MOEDAS[m.group(1)] for m in MOEDAS_REGEX.finditer(text)))
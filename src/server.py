@@ -0,0 +1,267 @@
+"""Servidor HTTP/WebSocket das conversas, independente da interface Streamlit.
+
+Execução: uvicorn src.server:app --workers 4
+
+Os workers não guardam estado da conversa: cada turno carrega a sessão do
+checkpointer (CHECKPOINT_DB) e os dados do armazenamento configurado, então
+qualquer worker atende qualquer sessão. Cada worker limita os turnos
+simultâneos (e, com eles, as chamadas ao Gemini); o que passa da fila é
+recusado com 429/503 e Retry-After.
+"""
+from dotenv import load_dotenv
+
+load_dotenv()  # Antes dos imports de src/: as configurações podem vir do .env
+
+import asyncio
+import json
+import logging
+import os
+import time
+from contextlib import AsyncExitStack, asynccontextmanager
+from fastapi import FastAPI, HTTPException, Path, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from langchain_core.messages import HumanMessage
+from pydantic import BaseModel, Field, ValidationError
+from src.conversation import STREAM_MODES, final_reply, metrics_snapshot, stream_events, visible_history
+from src.agents import get_agents
+from src.graph import get_app_graph
+from src.locks import row_locks
+from src.sessions import TURN_DURABILITY, checkpoint_path, new_thread_id, session_config
+from src.tracing import metrics, turn_trace
+
+logger = logging.getLogger(__name__)
+
+MAX_MESSAGE_CHARS = 4000
+SESSION_ID = Path(pattern=r"^[A-Za-z0-9_-]{1,64}$")
+
+class Busy(Exception):
+    def __init__(self, status, retry_after, detail):
+        super().__init__(detail)
+        self.status = status
+        self.retry_after = retry_after
+        self.detail = detail
+
+class TurnLimiter:
+    """Limita os turnos simultâneos deste worker.
+
+    Até `max_concurrent` turnos executam ao mesmo tempo e até `max_waiting`
+    aguardam vaga por no máximo `queue_timeout` segundos. Com a fila cheia o
+    turno é recusado na hora (429); se a espera esgotar, com 503. Como o limite
+    é por worker, o teto de chamadas simultâneas ao Gemini é
+    `max_concurrent` x número de workers.
+    """
+
+    def __init__(self, max_concurrent=8, max_waiting=32, queue_timeout=30.0, retry_after=5):
+        self.max_concurrent = max_concurrent
+        self.max_waiting = max_waiting
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.active = 0
+        self.waiting = 0
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_concurrent=int(os.getenv("SERVER_MAX_CONCURRENCY", 8)),
+            max_waiting=int(os.getenv("SERVER_MAX_QUEUE", 32)),
+            queue_timeout=float(os.getenv("SERVER_QUEUE_TIMEOUT", 30)),
+            retry_after=int(os.getenv("SERVER_RETRY_AFTER", 5)),
+        )
+
+    @asynccontextmanager
+    async def slot(self):
+        if self._semaphore.locked() and self.waiting >= self.max_waiting:
+            metrics.incr("server.rejected_429")
+            raise Busy(429, self.retry_after, "Muitas conversas em andamento; tente novamente em instantes.")
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            metrics.incr("server.rejected_503")
+            raise Busy(503, self.retry_after, "Tempo de espera por uma vaga esgotado; tente novamente.") from None
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+
+    def snapshot(self):
+        return {"active": self.active, "waiting": self.waiting, "max_concurrent": self.max_concurrent, "max_waiting": self.max_waiting}
+
+class SessionLocks:
+    """Serializa os turnos de uma mesma sessão, neste worker e entre os workers.
+
+    Dois turnos simultâneos partiriam do mesmo checkpoint e o CompactSqliteSaver
+    apagaria o do primeiro a terminar. No worker, as esperas são um asyncio.Lock
+    por sessão; entre workers, a sessão também é travada no arquivo
+    `<CHECKPOINT_DB>.lock` (src/locks.py), numa thread para não bloquear o event loop.
+    """
+
+    def __init__(self, path=None):
+        self._locks = {}  # sessão -> [lock, turnos usando ou aguardando]
+        self._files = row_locks(path or checkpoint_path() + ".lock")
+
+    @asynccontextmanager
+    async def hold(self, session_id):
+        entry = self._locks.setdefault(session_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                held = self._files.hold(session_id)
+                acquire = asyncio.ensure_future(asyncio.to_thread(held.__enter__))
+                try:
+                    await asyncio.shield(acquire)
+                except asyncio.CancelledError:
+                    # A thread ainda vai obter a trava: solta assim que obtiver
+                    acquire.add_done_callback(lambda f: f.cancelled() or f.exception() or held.__exit__(None, None, None))
+                    raise
+                try:
+                    yield
+                finally:
+                    held.__exit__(None, None, None)
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[session_id]
+
+limiter = TurnLimiter.from_env()
+session_locks = SessionLocks()
+
+class TurnRequest(BaseModel):
+    message: str = Field(min_length=1, max_length=MAX_MESSAGE_CHARS)
+
+async def enter_turn(stack, session_id):
+    """Reserva a sessão e uma vaga do limitador; a sessão primeiro, para que esperar por ela não ocupe vaga."""
+    await stack.enter_async_context(session_locks.hold(session_id))
+    await stack.enter_async_context(limiter.slot())
+
+def busy_response(error):
+    return HTTPException(error.status, error.detail, headers={"Retry-After": str(error.retry_after)})
+
+async def turn_events(session_id, text):
+    config = session_config(session_id)
+    start = time.perf_counter()
+    with turn_trace(session_id):
+        async for mode, chunk in get_app_graph().astream({"messages": [HumanMessage(content=text)]}, config,
+                                                         stream_mode=STREAM_MODES, durability=TURN_DURABILITY):
+            for event in stream_events(mode, chunk):
+                yield event
+    state = await get_app_graph().aget_state(config)
+    yield {"type": "done", "reply": final_reply(state.values["messages"]), "elapsed_ms": (time.perf_counter() - start) * 1000}
+
+@asynccontextmanager
+async def lifespan(app):
+    # O grafo e os agentes são montados no primeiro uso (src/graph.py): cada
+    # worker os monta ao subir, antes de aceitar turnos, e não no primeiro turno
+    await asyncio.to_thread(lambda: (get_app_graph(), get_agents()))
+    yield
+
+app = FastAPI(title="Banco Ágil - Atendimento", lifespan=lifespan)
+
+@app.get("/health")
+async def health():
+    return {"status": "ok", "pid": os.getpid(), **limiter.snapshot()}
+
+@app.get("/metrics")
+async def get_metrics():
+    return {**metrics_snapshot(), "limiter": limiter.snapshot(), "pid": os.getpid()}
+
+@app.post("/sessions")
+async def create_session():
+    return {"session_id": new_thread_id()}
+
+@app.get("/sessions/{session_id}/messages")
+async def get_messages(session_id: str = SESSION_ID):
+    state = await get_app_graph().aget_state(session_config(session_id))
+    return {"session_id": session_id, "messages": visible_history(state.values.get("messages", []))}
+
+@app.post("/sessions/{session_id}/turns")
+async def post_turn(request: TurnRequest, session_id: str = SESSION_ID):
+    async with AsyncExitStack() as stack:
+        try:
+            await enter_turn(stack, session_id)
+        except Busy as error:
+            raise busy_response(error)
+        start = time.perf_counter()
+        with turn_trace(session_id):
+            state = await get_app_graph().ainvoke({"messages": [HumanMessage(content=request.message)]},
+                                                  session_config(session_id), durability=TURN_DURABILITY)
+    return {"session_id": session_id, "reply": final_reply(state["messages"]), "elapsed_ms": (time.perf_counter() - start) * 1000}
+
+@app.post("/sessions/{session_id}/turns/stream")
+async def post_turn_stream(request: TurnRequest, session_id: str = SESSION_ID):
+    """Turno com streaming em NDJSON (um evento JSON por linha, o último com "type": "done")."""
+    # A vaga é reservada antes de responder, para que a recusa ainda saia como 429/503
+    stack = AsyncExitStack()
+    try:
+        await enter_turn(stack, session_id)
+    except Busy as error:
+        await stack.aclose()
+        raise busy_response(error)
+
+    async def body():
+        try:
+            async for event in turn_events(session_id, request.message):
+                yield json.dumps(event, ensure_ascii=False) + "\n"
+        except Exception as error:
+            logger.exception("Falha no turno da sessão %s", session_id)
+            yield json.dumps({"type": "error", "detail": str(error)}, ensure_ascii=False) + "\n"
+        finally:
+            await stack.aclose()
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
+
+async def receive_turn(websocket):
+    """Texto da próxima mensagem do cliente, ou None (já respondido com um evento de erro) se ela for inválida."""
+    try:
+        data = await websocket.receive_json()
+    except WebSocketDisconnect:
+        raise
+    except (ValueError, KeyError, TypeError):
+        # JSON inválido ou frame binário
+        await websocket.send_json({"type": "error", "status": 400, "detail": "Mensagem deve ser um JSON {\"message\": \"...\"}."})
+        return None
+    try:
+        text = TurnRequest.model_validate(data).message.strip()
+    except ValidationError as error:
+        # Mesma validação do corpo das rotas HTTP (objeto com "message" em texto, até MAX_MESSAGE_CHARS)
+        await websocket.send_json({"type": "error", "status": 422, "detail": error.errors(include_url=False, include_input=False)})
+        return None
+    if not text:
+        await websocket.send_json({"type": "error", "status": 422, "detail": "Mensagem vazia."})
+        return None
+    return text
+
+@app.websocket("/sessions/{session_id}/ws")
+async def session_socket(websocket: WebSocket, session_id: str = SESSION_ID):
+    """Cada mensagem {"message": ...} do cliente inicia um turno; a resposta vem nos mesmos eventos do streaming HTTP.
+
+    Mensagens inválidas e falhas do turno viram um evento {"type": "error"} e
+    a conexão continua aberta para o próximo turno.
+    """
+    await websocket.accept()
+    try:
+        while True:
+            text = await receive_turn(websocket)
+            if text is None:
+                continue
+            async with AsyncExitStack() as stack:
+                try:
+                    await enter_turn(stack, session_id)
+                except Busy as error:
+                    await websocket.send_json({"type": "error", "status": error.status, "retry_after": error.retry_after, "detail": error.detail})
+                    continue
+                try:
+                    async for event in turn_events(session_id, text):
+                        await websocket.send_json(event)
+                except WebSocketDisconnect:
+                    raise
+                except Exception as error:
+                    logger.exception("Falha no turno da sessão %s", session_id)
+                    await websocket.send_json({"type": "error", "status": 500, "detail": str(error)})
+    except WebSocketDisconnect:
+        pass
@@ -0,0 +1,105 @@
+import asyncio
+import functools
+import hashlib
+import hmac
+import os
+import sqlite3
+import time
+import uuid
+from src.utils import DATA_DIR
+
+CHECKPOINT_FILE = os.path.join(DATA_DIR, 'checkpoints.sqlite')
+
+# Cookie com que a interface retoma a sessão após recarregar a página ou reiniciar
+RESUME_COOKIE = "banco_agil_sessao"
+
+# O estado é gravado uma vez ao final de cada turno, não a cada passo do grafo
+TURN_DURABILITY = "exit"
+
+@functools.cache
+def compact_sqlite_saver():
+    """Classe CompactSqliteSaver, ou None se langgraph-checkpoint-sqlite não estiver instalado.
+
+    Definida no primeiro uso: importar langgraph.checkpoint.sqlite é caro e só
+    quem compila o grafo precisa dele.
+    """
+    try:
+        from langgraph.checkpoint.sqlite import SqliteSaver
+    except ImportError:
+        return None
+
+    class CompactSqliteSaver(SqliteSaver):
+        """SqliteSaver que mantém apenas o checkpoint mais recente de cada sessão.
+
+        Junto com a gravação no fim do turno, o banco guarda uma cópia do estado
+        por sessão em vez de uma cópia por passo de cada turno. Os métodos
+        assíncronos (usados por `app_graph.ainvoke`) executam as operações
+        síncronas numa thread, fora do event loop.
+        """
+
+        def put(self, config, checkpoint, metadata, new_versions):
+            new_config = super().put(config, checkpoint, metadata, new_versions)
+            configurable = new_config["configurable"]
+            key = (configurable["thread_id"], configurable["checkpoint_ns"], configurable["checkpoint_id"])
+            with self.cursor() as cur:
+                cur.execute("DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id != ?", key)
+                cur.execute("DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id != ?", key)
+            return new_config
+
+        async def aget_tuple(self, config):
+            return await asyncio.to_thread(self.get_tuple, config)
+
+        async def alist(self, config, *, filter=None, before=None, limit=None):
+            items = await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+            for item in items:
+                yield item
+
+        async def aput(self, config, checkpoint, metadata, new_versions):
+            return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+        async def aput_writes(self, config, writes, task_id, task_path=""):
+            return await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+        async def adelete_thread(self, thread_id):
+            return await asyncio.to_thread(self.delete_thread, thread_id)
+
+    return CompactSqliteSaver
+
+def checkpoint_path():
+    return os.getenv("CHECKPOINT_DB", CHECKPOINT_FILE)
+
+def create_checkpointer(path=None):
+    """Checkpointer das sessões: SQLite local (CHECKPOINT_DB) ou em memória se o pacote não existir."""
+    saver = compact_sqlite_saver()
+    if saver is None:
+        from langgraph.checkpoint.memory import InMemorySaver
+        return InMemorySaver()
+    conn = sqlite3.connect(path or checkpoint_path(), check_same_thread=False, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    return saver(conn)
+
+def new_thread_id():
+    return uuid.uuid4().hex
+
+def _sign(payload, secret):
+    return hmac.new(secret.encode(), payload.encode(), hashlib.sha256).hexdigest()
+
+def resume_token(thread_id, secret, ttl, now=None):
+    """Token assinado que permite retomar a sessão `thread_id` por `ttl` segundos."""
+    payload = f"{thread_id}.{int((now or time.time()) + ttl)}"
+    return f"{payload}.{_sign(payload, secret)}"
+
+def thread_from_resume_token(token, secret, now=None):
+    """thread_id do token, ou None se ele estiver expirado, malformado ou com assinatura inválida."""
+    parts = (token or "").split(".")
+    if len(parts) != 3 or not parts[1].isdigit():
+        return None
+    thread_id, expires, signature = parts
+    if not hmac.compare_digest(signature, _sign(f"{thread_id}.{expires}", secret)):
+        return None
+    if int(expires) < (now or time.time()):
+        return None
+    return thread_id
+
+def session_config(thread_id):
+    return {"configurable": {"thread_id": thread_id}}
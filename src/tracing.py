@@ -0,0 +1,233 @@
+import contextvars
+import functools
+import inspect
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+class MetricsRegistry:
+    """Registro em processo das durações de cada tipo de span e de contadores.
+
+    Guarda as últimas `window` durações por nome de span (ms) para calcular
+    p50/p95/p99, contadores acumulados (ex: tokens por agente) e os traces
+    completos dos últimos `max_traces` turnos.
+    """
+
+    def __init__(self, window=2048, max_traces=20):
+        self._lock = threading.Lock()
+        self._window = window
+        self._durations = defaultdict(lambda: deque(maxlen=self._window))
+        self._counts = defaultdict(int)
+        self._errors = defaultdict(int)
+        self._counters = defaultdict(float)
+        self._traces = deque(maxlen=max_traces)
+
+    def observe(self, name, duration_ms, error=False):
+        with self._lock:
+            self._durations[name].append(duration_ms)
+            self._counts[name] += 1
+            if error:
+                self._errors[name] += 1
+
+    def incr(self, name, value=1):
+        with self._lock:
+            self._counters[name] += value
+
+    def add_trace(self, trace):
+        with self._lock:
+            self._traces.append(trace)
+
+    def histograms(self):
+        """Uma linha por span: contagem, erros e percentis das durações recentes (ms)."""
+        with self._lock:
+            items = [(name, sorted(values), self._counts[name], self._errors[name]) for name, values in self._durations.items()]
+        rows = []
+        for name, values, count, errors in sorted(items):
+            if not values:
+                continue
+            rows.append({
+                "span": name,
+                "count": count,
+                "errors": errors,
+                "p50_ms": percentile(values, 50),
+                "p95_ms": percentile(values, 95),
+                "p99_ms": percentile(values, 99),
+                "max_ms": values[-1],
+            })
+        return rows
+
+    def counters(self):
+        with self._lock:
+            return dict(sorted(self._counters.items()))
+
+    def traces(self):
+        with self._lock:
+            return list(self._traces)
+
+    def clear(self):
+        with self._lock:
+            self._durations.clear()
+            self._counts.clear()
+            self._errors.clear()
+            self._counters.clear()
+            self._traces.clear()
+
+def percentile(sorted_values, p):
+    # Nearest-rank sobre valores já ordenados
+    index = max(int(round(p / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+metrics = MetricsRegistry()
+
+class Trace:
+    """Spans de um turno, com início relativo ao começo do turno (para a visão em cascata)."""
+
+    def __init__(self, session=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.session = session
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+        self.spans = []
+
+    def add(self, name, start, duration_ms, depth, attrs, error):
+        with self._lock:
+            self.spans.append({
+                "span": name,
+                "start_ms": (start - self._start) * 1000,
+                "duration_ms": duration_ms,
+                "depth": depth,
+                "error": error,
+                **attrs,
+            })
+
+    def rows(self):
+        with self._lock:
+            return sorted(self.spans, key=lambda s: s["start_ms"])
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+_depth = contextvars.ContextVar("span_depth", default=0)
+
+# --- OpenTelemetry (opcional) ---
+# Configurado no primeiro span, e não na importação: assim TRACING_OTEL pode vir do .env
+_otel_tracer = None
+_otel_configured = False
+_otel_lock = threading.Lock()
+
+def configure_otel():
+    """Exporta os spans também via OpenTelemetry quando TRACING_OTEL=1.
+
+    Com `opentelemetry-sdk` instalado e sem provider configurado, registra um
+    provider com exportador OTLP (se `opentelemetry-exporter-otlp` estiver
+    instalado, usando as variáveis OTEL_EXPORTER_OTLP_*) ou de console.
+    """
+    global _otel_tracer
+    from dotenv import load_dotenv
+    load_dotenv()  # O primeiro span pode vir antes de src/agents.py carregar o .env
+    if os.getenv("TRACING_OTEL", "0") in ("0", "false", "False"):
+        return None
+    try:
+        from opentelemetry import trace
+    except ImportError:
+        logger.warning("TRACING_OTEL=1, mas o pacote opentelemetry-api não está instalado.")
+        return None
+    try:
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+    except ImportError:
+        TracerProvider = None  # Apenas a API: os spans vão para o provider que a aplicação configurar
+    if TracerProvider is not None and not isinstance(trace.get_tracer_provider(), TracerProvider):
+        try:
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+            exporter = OTLPSpanExporter()
+        except ImportError:
+            exporter = ConsoleSpanExporter()
+        provider = TracerProvider()
+        provider.add_span_processor(BatchSpanProcessor(exporter))
+        trace.set_tracer_provider(provider)
+    _otel_tracer = trace.get_tracer("banco_agil")
+    return _otel_tracer
+
+def _configure_otel_once():
+    global _otel_configured
+    with _otel_lock:
+        if not _otel_configured:
+            configure_otel()
+            _otel_configured = True
+
+class Span:
+    """Span em andamento; `set` adiciona atributos (ex: tokens) antes de ser encerrado."""
+
+    __slots__ = ("name", "attrs")
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+@contextmanager
+def span(name, **attrs):
+    """Mede um trecho: alimenta o histograma `name`, o trace do turno atual e o OpenTelemetry."""
+    if not _otel_configured:
+        _configure_otel_once()
+    current = Span(name, attrs)
+    depth_token = _depth.set(_depth.get() + 1)
+    otel_cm = _otel_tracer.start_as_current_span(name) if _otel_tracer is not None else None
+    otel_span = otel_cm.__enter__() if otel_cm is not None else None
+    start = time.perf_counter()
+    error = False
+    try:
+        yield current
+    except BaseException:
+        error = True
+        raise
+    finally:
+        duration_ms = (time.perf_counter() - start) * 1000
+        _depth.reset(depth_token)
+        metrics.observe(name, duration_ms, error)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(name, start, duration_ms, _depth.get(), current.attrs, error)
+        if otel_span is not None:
+            for key, value in current.attrs.items():
+                if value is not None:
+                    otel_span.set_attribute(key, value)
+            otel_cm.__exit__(*sys.exc_info())
+
+@contextmanager
+def turn_trace(session=None):
+    """Agrupa os spans de um turno da conversa; o trace fica disponível em `metrics.traces()`."""
+    trace = Trace(session)
+    token = _current_trace.set(trace)
+    try:
+        with span("turn", session=session):
+            yield trace
+    finally:
+        _current_trace.reset(token)
+        metrics.add_trace(trace)
+
+def traced(name, **attrs):
+    """Decorador que executa a função (síncrona ou assíncrona) dentro de um span."""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(name, **attrs):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name, **attrs):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -1,31 +1,543 @@
-import pandas as pd
+import bisect
+import csv
 import os
+import sqlite3
+import threading
+import time
 from datetime import datetime
+from src.audit import AuditLog
+from src.locks import row_locks
+from src.tracing import metrics, traced
 
 DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data')
 CLIENTES_FILE = os.path.join(DATA_DIR, 'clientes.csv')
 SCORE_FILE = os.path.join(DATA_DIR, 'score_limite.csv')
 SOLICITACOES_FILE = os.path.join(DATA_DIR, 'solicitacoes_aumento_limite.csv')
+SQLITE_FILE = os.path.join(DATA_DIR, 'banco.sqlite')
+
+CLIENTES_COLUMNS = ['cpf', 'data_nascimento', 'score', 'limite', 'renda_mensal', 'tipo_emprego', 'despesas', 'dependentes', 'tem_dividas', 'versao']
+SCORE_COLUMNS = ['min_score', 'max_score', 'limite_maximo']
+SOLICITACOES_COLUMNS = ['cpf_cliente', 'data_hora_solicitacao', 'limite_atual', 'novo_limite_solicitado', 'status_pedido']
+BLOQUEIOS_COLUMNS = ['cpf', 'bloqueado_ate']  # bloqueado_ate: timestamp Unix
+FALHAS_COLUMNS = ['cpf', 'instante']  # Falhas de autenticação recentes, compartilhadas entre processos
+
+class VersionConflict(Exception):
+    """O cliente foi alterado por outra escrita desde a leitura (`versao` diferente da esperada)."""
+
+def with_versao(df):
+    # Bases anteriores ao controle de versão não têm a coluna: todas as linhas começam em 0
+    if 'versao' not in df.columns:
+        df['versao'] = 0
+    df['versao'] = df['versao'].fillna(0).astype(int)
+    return df
 
 def load_clientes():
+    import pandas as pd
     return pd.read_csv(CLIENTES_FILE, dtype={'cpf': str})
 
 def save_clientes(df):
     df.to_csv(CLIENTES_FILE, index=False)
+    get_storage().invalidate()
+
+class ClienteRepository:
+    """Base de clientes em memória, indexada por CPF.
+
+    O CSV é lido uma única vez e recarregado apenas quando o arquivo muda
+    em disco (mtime/tamanho), então cada consulta é um acesso ao dicionário.
+
+    Um CSV não permite alterar uma linha no lugar: cada atualização reescreve
+    o arquivo. Para que escritas de processos diferentes não se sobrescrevam,
+    a reescrita acontece sob a trava do arquivo inteiro (`locks.hold_all`),
+    depois de recarregar o que outro processo tenha gravado.
+    """
+
+    def __init__(self, path=CLIENTES_FILE):
+        self.path = path
+        self._lock = threading.RLock()
+        self._index = {}
+        self._columns = []
+        self._signature = None
+        self.locks = row_locks(path + '.lock')
+
+    def _file_signature(self):
+        st = os.stat(self.path)
+        return (st.st_mtime_ns, st.st_size)
+
+    def _refresh(self):
+        import pandas as pd
+        signature = self._file_signature()
+        if signature == self._signature:
+            return
+        with self._lock:
+            if signature == self._signature:
+                return
+            df = with_versao(pd.read_csv(self.path, dtype={'cpf': str}))
+            self._columns = list(df.columns)
+            self._index = {row['cpf']: row for row in df.to_dict('records')}
+            self._signature = signature
+
+    def invalidate(self):
+        with self._lock:
+            self._signature = None
+
+    def get(self, cpf):
+        self._refresh()
+        row = self._index.get(cpf)
+        return dict(row) if row is not None else None
+
+    def update(self, cpf, expected_version=None, **fields):
+        with self._lock, self.locks.hold_all():
+            self._refresh()
+            row = self._index.get(cpf)
+            if row is None:
+                return False
+            if expected_version is not None and row['versao'] != expected_version:
+                raise VersionConflict(cpf)
+            row.update(fields)
+            row['versao'] += 1
+            try:
+                self._write()
+            except Exception:
+                self._signature = None  # Descarta a alteração que não chegou ao disco
+                raise
+            return True
+
+    def _write(self):
+        import pandas as pd
+        df = pd.DataFrame(list(self._index.values()), columns=self._columns)
+        tmp_path = self.path + '.tmp'
+        df.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, self.path)
+        self._signature = self._file_signature()
+
+# --- Backends de Armazenamento ---
+# Ambos expõem a mesma interface: get_cliente, update_cliente, lock_cliente,
+# list_clientes, load_score_table, append_solicitacao, list_solicitacoes,
+# list_bloqueios, get_bloqueio, save_bloqueio, add_falha_auth,
+# clear_falhas_auth e invalidate.
+#
+# Toda atualização de cliente incrementa a coluna `versao`; com
+# `expected_version`, update_cliente só grava se a linha ainda estiver nessa
+# versão (senão levanta VersionConflict). `lock_cliente(cpf)` é a trava do
+# CPF entre threads e processos, usada por modify_cliente.
+
+class CSVStorage:
+    """Backend original em arquivos CSV (modo de compatibilidade)."""
+
+    def __init__(self, data_dir=DATA_DIR):
+        self.clientes_file = os.path.join(data_dir, 'clientes.csv')
+        self.score_file = os.path.join(data_dir, 'score_limite.csv')
+        self.solicitacoes_file = os.path.join(data_dir, 'solicitacoes_aumento_limite.csv')
+        self.bloqueios_file = os.path.join(data_dir, 'auth_bloqueios.csv')
+        self.falhas_file = os.path.join(data_dir, 'auth_falhas.csv')
+        self.clientes = ClienteRepository(self.clientes_file)
+        # Novas solicitações vão para segmentos em data/solicitacoes/; o CSV original é lido como o mais antigo
+        self.audit = AuditLog.from_env(os.path.join(data_dir, 'solicitacoes'), SOLICITACOES_COLUMNS, legacy_file=self.solicitacoes_file)
+        # Os arquivos de bloqueios e falhas são reescritos inteiros, sob a trava de arquivo
+        self.auth_locks = row_locks(os.path.join(data_dir, 'auth.lock'))
+
+    def invalidate(self):
+        self.clientes.invalidate()
+
+    @traced("storage.get_cliente", backend="csv")
+    def get_cliente(self, cpf):
+        return self.clientes.get(cpf)
+
+    @traced("storage.update_cliente", backend="csv")
+    def update_cliente(self, cpf, expected_version=None, **fields):
+        return self.clientes.update(cpf, expected_version, **fields)
+
+    def lock_cliente(self, cpf):
+        return self.clientes.locks.hold(cpf)
+
+    @traced("storage.list_clientes", backend="csv")
+    def list_clientes(self):
+        import pandas as pd
+        return with_versao(pd.read_csv(self.clientes_file, dtype={'cpf': str}))
+
+    @traced("storage.load_score_table", backend="csv")
+    def load_score_table(self):
+        import pandas as pd
+        return pd.read_csv(self.score_file).to_dict('records')
+
+    def score_table_version(self):
+        st = os.stat(self.score_file)
+        return (st.st_mtime_ns, st.st_size)
+
+    @traced("storage.append_solicitacao", backend="csv")
+    def append_solicitacao(self, row):
+        # Só enfileira: o log de auditoria grava em lotes, fora do turno do usuário
+        self.audit.append(row)
+
+    @traced("storage.list_solicitacoes", backend="csv")
+    def list_solicitacoes(self, limit=None):
+        """Solicitações em ordem cronológica; com `limit`, apenas as últimas (sem ler todos os segmentos)."""
+        import pandas as pd
+        self.audit.flush(timeout=5)
+        df = pd.DataFrame(self.audit.read(limit), columns=SOLICITACOES_COLUMNS)
+        for column in ('limite_atual', 'novo_limite_solicitado'):
+            df[column] = pd.to_numeric(df[column], errors='coerce')
+        return df
+
+    def _read_bloqueios(self):
+        if not os.path.exists(self.bloqueios_file):
+            return {}
+        with open(self.bloqueios_file, newline='', encoding='utf-8') as f:
+            return {row['cpf']: float(row['bloqueado_ate']) for row in csv.DictReader(f)}
+
+    def _read_falhas(self):
+        if not os.path.exists(self.falhas_file):
+            return []
+        with open(self.falhas_file, newline='', encoding='utf-8') as f:
+            return [(row['cpf'], float(row['instante'])) for row in csv.DictReader(f)]
+
+    @staticmethod
+    def _rewrite(path, columns, rows):
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(columns)
+            writer.writerows(rows)
+        os.replace(tmp_path, path)
+
+    @traced("storage.list_bloqueios", backend="csv")
+    def list_bloqueios(self):
+        """Bloqueios de autenticação ainda ativos: {cpf: bloqueado_ate}."""
+        now = time.time()
+        # Sem trava: o arquivo só é substituído com os.replace
+        return {cpf: until for cpf, until in self._read_bloqueios().items() if until > now}
+
+    @traced("storage.get_bloqueio", backend="csv")
+    def get_bloqueio(self, cpf):
+        """Instante até o qual o CPF está bloqueado (0 se não houver bloqueio)."""
+        return self._read_bloqueios().get(cpf, 0)
+
+    @traced("storage.save_bloqueio", backend="csv")
+    def save_bloqueio(self, cpf, until):
+        # Arquivo pequeno: reescrito sem os bloqueios já vencidos
+        now = time.time()
+        with self.auth_locks.hold_all():
+            bloqueios = {c: u for c, u in self._read_bloqueios().items() if u > now}
+            bloqueios[cpf] = until
+            self._rewrite(self.bloqueios_file, BLOQUEIOS_COLUMNS, bloqueios.items())
+
+    @traced("storage.add_falha_auth", backend="csv")
+    def add_falha_auth(self, cpf, now, window):
+        """Registra uma falha de autenticação do CPF; retorna quantas ele teve nos últimos `window` segundos."""
+        with self.auth_locks.hold_all():
+            falhas = [(c, t) for c, t in self._read_falhas() if t > now - window]
+            falhas.append((cpf, now))
+            self._rewrite(self.falhas_file, FALHAS_COLUMNS, falhas)
+        return sum(c == cpf for c, _ in falhas)
+
+    @traced("storage.clear_falhas_auth", backend="csv")
+    def clear_falhas_auth(self, cpf):
+        with self.auth_locks.hold_all():
+            falhas = self._read_falhas()
+            if any(c == cpf for c, _ in falhas):
+                self._rewrite(self.falhas_file, FALHAS_COLUMNS, [(c, t) for c, t in falhas if c != cpf])
+
+class SQLiteStorage:
+    """Backend transacional em SQLite (WAL), com índice por CPF.
+
+    Cada thread usa sua própria conexão; atualizações afetam uma única linha
+    (com a verificação de `versao` no próprio UPDATE) e solicitações são
+    apenas INSERTs.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS clientes (
+        cpf TEXT PRIMARY KEY,
+        data_nascimento TEXT NOT NULL,
+        score INTEGER NOT NULL,
+        limite REAL NOT NULL,
+        renda_mensal REAL,
+        tipo_emprego TEXT,
+        despesas REAL,
+        dependentes INTEGER,
+        tem_dividas TEXT,
+        versao INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE TABLE IF NOT EXISTS score_limite (
+        min_score INTEGER NOT NULL,
+        max_score INTEGER NOT NULL,
+        limite_maximo REAL NOT NULL
+    );
+    -- Versão da tabela de faixas, incrementada pelos gatilhos a cada alteração em score_limite
+    CREATE TABLE IF NOT EXISTS score_limite_versao (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        versao INTEGER NOT NULL
+    );
+    INSERT OR IGNORE INTO score_limite_versao (id, versao) VALUES (1, 0);
+    CREATE TRIGGER IF NOT EXISTS score_limite_insert AFTER INSERT ON score_limite
+    BEGIN UPDATE score_limite_versao SET versao = versao + 1 WHERE id = 1; END;
+    CREATE TRIGGER IF NOT EXISTS score_limite_update AFTER UPDATE ON score_limite
+    BEGIN UPDATE score_limite_versao SET versao = versao + 1 WHERE id = 1; END;
+    CREATE TRIGGER IF NOT EXISTS score_limite_delete AFTER DELETE ON score_limite
+    BEGIN UPDATE score_limite_versao SET versao = versao + 1 WHERE id = 1; END;
+    CREATE TABLE IF NOT EXISTS solicitacoes_aumento_limite (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        cpf_cliente TEXT NOT NULL,
+        data_hora_solicitacao TEXT NOT NULL,
+        limite_atual REAL,
+        novo_limite_solicitado REAL,
+        status_pedido TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_solicitacoes_cpf ON solicitacoes_aumento_limite (cpf_cliente);
+    CREATE TABLE IF NOT EXISTS auth_bloqueios (
+        cpf TEXT PRIMARY KEY,
+        bloqueado_ate REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS auth_falhas (
+        cpf TEXT NOT NULL,
+        instante REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_auth_falhas_cpf ON auth_falhas (cpf);
+    CREATE INDEX IF NOT EXISTS idx_auth_falhas_instante ON auth_falhas (instante);
+    """
+
+    def __init__(self, path=SQLITE_FILE):
+        self.path = path
+        self._local = threading.local()
+        self.conn.executescript(self.SCHEMA)
+        columns = {r['name'] for r in self.conn.execute('PRAGMA table_info(clientes)')}
+        if 'versao' not in columns:
+            # Banco criado antes do controle de versão
+            with self.conn:
+                self.conn.execute('ALTER TABLE clientes ADD COLUMN versao INTEGER NOT NULL DEFAULT 0')
+        self.locks = row_locks(path + '.lock')
+
+    @property
+    def conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def invalidate(self):
+        pass
+
+    @traced("storage.get_cliente", backend="sqlite")
+    def get_cliente(self, cpf):
+        row = self.conn.execute('SELECT * FROM clientes WHERE cpf = ?', (cpf,)).fetchone()
+        return dict(row) if row is not None else None
+
+    @traced("storage.update_cliente", backend="sqlite")
+    def update_cliente(self, cpf, expected_version=None, **fields):
+        columns = [c for c in fields if c in CLIENTES_COLUMNS and c not in ('cpf', 'versao')]
+        if not columns:
+            return False
+        assignments = ', '.join(f'{c} = ?' for c in columns)
+        query = f'UPDATE clientes SET {assignments}, versao = versao + 1 WHERE cpf = ?'
+        params = [fields[c] for c in columns] + [cpf]
+        if expected_version is not None:
+            query += ' AND versao = ?'
+            params.append(expected_version)
+        with self.conn:
+            cursor = self.conn.execute(query, params)
+        if cursor.rowcount == 0 and expected_version is not None:
+            if self.conn.execute('SELECT 1 FROM clientes WHERE cpf = ?', (cpf,)).fetchone() is not None:
+                raise VersionConflict(cpf)
+        return cursor.rowcount > 0
+
+    def lock_cliente(self, cpf):
+        return self.locks.hold(cpf)
+
+    @traced("storage.list_clientes", backend="sqlite")
+    def list_clientes(self):
+        import pandas as pd
+        return pd.read_sql_query('SELECT * FROM clientes', self.conn)
+
+    @traced("storage.load_score_table", backend="sqlite")
+    def load_score_table(self):
+        rows = self.conn.execute('SELECT min_score, max_score, limite_maximo FROM score_limite').fetchall()
+        return [dict(r) for r in rows]
+
+    def score_table_version(self):
+        # Só alterações em score_limite mudam a versão; escritas nas demais tabelas não recarregam as faixas
+        return self.conn.execute('SELECT versao FROM score_limite_versao WHERE id = 1').fetchone()[0]
+
+    @traced("storage.append_solicitacao", backend="sqlite")
+    def append_solicitacao(self, row):
+        with self.conn:
+            self.conn.execute(
+                'INSERT INTO solicitacoes_aumento_limite (cpf_cliente, data_hora_solicitacao, limite_atual, novo_limite_solicitado, status_pedido) '
+                'VALUES (:cpf_cliente, :data_hora_solicitacao, :limite_atual, :novo_limite_solicitado, :status_pedido)',
+                row
+            )
+
+    @traced("storage.list_solicitacoes", backend="sqlite")
+    def list_solicitacoes(self, limit=None):
+        import pandas as pd
+        query = f"SELECT {', '.join(SOLICITACOES_COLUMNS)} FROM solicitacoes_aumento_limite"
+        if limit is None:
+            return pd.read_sql_query(query + " ORDER BY id", self.conn)
+        df = pd.read_sql_query(query + " ORDER BY id DESC LIMIT ?", self.conn, params=(limit,))
+        return df.iloc[::-1].reset_index(drop=True)
+
+    @traced("storage.list_bloqueios", backend="sqlite")
+    def list_bloqueios(self):
+        rows = self.conn.execute('SELECT cpf, bloqueado_ate FROM auth_bloqueios WHERE bloqueado_ate > ?', (time.time(),)).fetchall()
+        return {r['cpf']: r['bloqueado_ate'] for r in rows}
+
+    @traced("storage.get_bloqueio", backend="sqlite")
+    def get_bloqueio(self, cpf):
+        row = self.conn.execute('SELECT bloqueado_ate FROM auth_bloqueios WHERE cpf = ?', (cpf,)).fetchone()
+        return row[0] if row is not None else 0
+
+    @traced("storage.save_bloqueio", backend="sqlite")
+    def save_bloqueio(self, cpf, until):
+        with self.conn:
+            self.conn.execute(
+                'INSERT INTO auth_bloqueios (cpf, bloqueado_ate) VALUES (?, ?) '
+                'ON CONFLICT(cpf) DO UPDATE SET bloqueado_ate = excluded.bloqueado_ate',
+                (cpf, until)
+            )
+
+    @traced("storage.add_falha_auth", backend="sqlite")
+    def add_falha_auth(self, cpf, now, window):
+        # Mesma transação: a contagem já inclui falhas gravadas por outros processos
+        with self.conn:
+            self.conn.execute('DELETE FROM auth_falhas WHERE instante <= ?', (now - window,))
+            self.conn.execute('INSERT INTO auth_falhas (cpf, instante) VALUES (?, ?)', (cpf, now))
+            return self.conn.execute('SELECT COUNT(*) FROM auth_falhas WHERE cpf = ?', (cpf,)).fetchone()[0]
+
+    @traced("storage.clear_falhas_auth", backend="sqlite")
+    def clear_falhas_auth(self, cpf):
+        with self.conn:
+            self.conn.execute('DELETE FROM auth_falhas WHERE cpf = ?', (cpf,))
+
+def import_csv_to_sqlite(db_path=SQLITE_FILE, data_dir=DATA_DIR):
+    """Importa os CSVs de `data_dir` para o banco SQLite, substituindo o conteúdo das tabelas."""
+    import pandas as pd
+    source = CSVStorage(data_dir)
+    target = SQLiteStorage(db_path)
+    clientes = source.list_clientes()[CLIENTES_COLUMNS]
+    scores = pd.read_csv(source.score_file)[SCORE_COLUMNS]
+    solicitacoes = source.list_solicitacoes()[SOLICITACOES_COLUMNS]
+
+    conn = target.conn
+    with conn:
+        conn.execute('DELETE FROM clientes')
+        conn.execute('DELETE FROM score_limite')
+        conn.execute('DELETE FROM solicitacoes_aumento_limite')
+        conn.executemany(
+            f"INSERT INTO clientes ({', '.join(CLIENTES_COLUMNS)}) VALUES ({', '.join('?' * len(CLIENTES_COLUMNS))})",
+            clientes.itertuples(index=False, name=None)
+        )
+        conn.executemany(
+            'INSERT INTO score_limite (min_score, max_score, limite_maximo) VALUES (?, ?, ?)',
+            scores.itertuples(index=False, name=None)
+        )
+        conn.executemany(
+            f"INSERT INTO solicitacoes_aumento_limite ({', '.join(SOLICITACOES_COLUMNS)}) VALUES (?, ?, ?, ?, ?)",
+            solicitacoes.itertuples(index=False, name=None)
+        )
+    return {'clientes': len(clientes), 'score_limite': len(scores), 'solicitacoes': len(solicitacoes)}
+
+_storage = None
+_storage_lock = threading.Lock()
+
+def get_storage():
+    """Retorna o backend configurado em STORAGE_BACKEND (`csv` por padrão ou `sqlite`)."""
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                backend = os.getenv('STORAGE_BACKEND', 'csv').lower()
+                if backend == 'sqlite':
+                    _storage = SQLiteStorage(os.getenv('SQLITE_DB', SQLITE_FILE))
+                elif backend == 'csv':
+                    _storage = CSVStorage()
+                else:
+                    raise ValueError(f"STORAGE_BACKEND inválido: {backend}")
+    return _storage
+
+def set_storage(storage):
+    global _storage
+    _storage = storage
+
+def get_cliente(cpf):
+    return get_storage().get_cliente(cpf)
 
 def authenticate_user(cpf, dob):
-    df = load_clientes()
-    user = df[(df['cpf'] == cpf) & (df['data_nascimento'] == dob)]
-    if not user.empty:
-        return user.iloc[0].to_dict()
+    user = get_cliente(cpf)
+    if user is not None and user['data_nascimento'] == dob:
+        return user
     return None
 
+class ScoreTable:
+    """Faixas de score compiladas em vetores ordenados e consultadas por busca binária.
+
+    A tabela é recarregada quando o backend reporta uma nova versão
+    (ex: o arquivo score_limite.csv foi alterado).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (versão, (mins, maxs, limites)): trocado numa única atribuição, então
+        # quem lê sem a trava nunca mistura faixas de duas cargas
+        self._loaded = (None, ((), (), ()))
+        self._arrays = None  # (faixas, vetores numpy) de lookup_many, montados no primeiro uso
+
+    def _refresh(self):
+        """Faixas atuais (mins, maxs, limites), recarregadas se a versão mudou."""
+        storage = get_storage()
+        key = (id(storage), storage.score_table_version())
+        loaded = self._loaded
+        if key == loaded[0]:
+            return loaded[1]
+        with self._lock:
+            loaded = self._loaded
+            if key == loaded[0]:
+                return loaded[1]
+            rows = sorted(storage.load_score_table(), key=lambda r: r['min_score'])
+            table = (
+                tuple(r['min_score'] for r in rows),
+                tuple(r['max_score'] for r in rows),
+                tuple(float(r['limite_maximo']) for r in rows),
+            )
+            self._loaded = (key, table)
+            return table
+
+    def lookup(self, score):
+        mins, maxs, limits = self._refresh()
+        i = bisect.bisect_right(mins, score) - 1
+        if i >= 0 and score <= maxs[i]:
+            return limits[i]
+        return 0.0
+
+    def _np_arrays(self, table):
+        import numpy as np
+        cached = self._arrays
+        if cached is None or cached[0] is not table:
+            cached = (table, tuple(np.asarray(values, dtype=float) for values in table))
+            self._arrays = cached
+        return cached[1]
+
+    def lookup_many(self, scores):
+        import numpy as np
+        mins, maxs, limits = self._np_arrays(self._refresh())
+        scores = np.asarray(scores, dtype=float)
+        if len(mins) == 0:
+            return np.zeros(scores.shape)
+        idx = np.searchsorted(mins, scores, side='right') - 1
+        safe_idx = idx.clip(min=0)
+        valid = (idx >= 0) & (scores <= maxs[safe_idx])
+        return np.where(valid, limits[safe_idx], 0.0)
+
+score_table = ScoreTable()
+
 def get_max_limit_for_score(score):
-    df = pd.read_csv(SCORE_FILE)
-    for _, row in df.iterrows():
-        if row['min_score'] <= score <= row['max_score']:
-            return row['limite_maximo']
-    return 0.0
+    return score_table.lookup(score)
+
+def get_max_limits_for_scores(scores):
+    """Versão vetorizada de get_max_limit_for_score para um array de scores."""
+    return score_table.lookup_many(scores)
 
 def log_limit_request(cpf, current_limit, requested_limit, status):
     new_request = {
@@ -35,33 +547,27 @@ def log_limit_request(cpf, current_limit, requested_limit, status):
         'novo_limite_solicitado': requested_limit,
         'status_pedido': status
     }
-    
-    if os.path.exists(SOLICITACOES_FILE):
-        df = pd.read_csv(SOLICITACOES_FILE)
-    else:
-        df = pd.DataFrame(columns=['cpf_cliente', 'data_hora_solicitacao', 'limite_atual', 'novo_limite_solicitado', 'status_pedido'])
-        
-    df = pd.concat([df, pd.DataFrame([new_request])], ignore_index=True)
-    df.to_csv(SOLICITACOES_FILE, index=False)
+    get_storage().append_solicitacao(new_request)
+
+# Pesos do score, compartilhados pela versão escalar e pela vetorizada
+PESO_RENDA = 30
+PESO_EMPREGO = {
+    "formal": 300,
+    "autonomo": 200,
+    "desempregado": 0
+}
+PESO_DEPENDENTES = {
+    0: 100,
+    1: 80,
+    2: 60,
+    "3+": 30
+}
+PESO_DIVIDAS = {
+    "sim": -100,
+    "nao": 100
+}
 
 def calculate_score(renda, tipo_emprego, dependentes, tem_dividas, despesas):
-    peso_renda = 30
-    peso_emprego = {
-        "formal": 300,
-        "autonomo": 200,
-        "desempregado": 0
-    }
-    peso_dependentes = {
-        0: 100,
-        1: 80,
-        2: 60,
-        "3+": 30
-    }
-    peso_dividas = {
-        "sim": -100,
-        "nao": 100
-    }
-    
     # Trata a chave de dependentes
     dep_key = dependentes
     if isinstance(dependentes, int) and dependentes >= 3:
@@ -72,18 +578,115 @@ def calculate_score(renda, tipo_emprego, dependentes, tem_dividas, despesas):
         dep_key = int(dependentes)
 
     score = (
-        (renda / (despesas + 1)) * peso_renda +
-        peso_emprego.get(tipo_emprego, 0) +
-        peso_dependentes.get(dep_key, 30) +
-        peso_dividas.get(tem_dividas, 0)
+        (renda / (despesas + 1)) * PESO_RENDA +
+        PESO_EMPREGO.get(tipo_emprego, 0) +
+        PESO_DEPENDENTES.get(dep_key, 30) +
+        PESO_DIVIDAS.get(tem_dividas, 0)
     )
     
     return min(max(int(score), 0), 1000) # Garante intervalo 0-1000
 
+def calculate_scores(df):
+    """Versão vetorizada de calculate_score sobre um DataFrame no formato de clientes.csv.
+
+    Usa as colunas renda_mensal, tipo_emprego, dependentes, tem_dividas e despesas
+    e retorna um array de inteiros idêntico a aplicar calculate_score linha a linha.
+    Linhas com renda/despesas ausentes recebem score 0.
+    """
+    import numpy as np
+    # Mesma regra do escalar: só "0", "1" e "2" têm peso próprio, o resto conta como "3+"
+    dep_pesos = {str(k): v for k, v in PESO_DEPENDENTES.items() if k != "3+"}
+    peso_dep = df['dependentes'].astype(str).map(dep_pesos).fillna(PESO_DEPENDENTES["3+"])
+    peso_emp = df['tipo_emprego'].map(PESO_EMPREGO).fillna(0)
+    peso_div = df['tem_dividas'].map(PESO_DIVIDAS).fillna(0)
+
+    renda = df['renda_mensal'].to_numpy(dtype=float)
+    despesas = df['despesas'].to_numpy(dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        score = (
+            (renda / (despesas + 1)) * PESO_RENDA +
+            peso_emp.to_numpy(dtype=float) +
+            peso_dep.to_numpy(dtype=float) +
+            peso_div.to_numpy(dtype=float)
+        )
+    score = np.nan_to_num(np.trunc(score), nan=0.0)
+    return np.clip(score, 0, 1000).astype(int)
+
+def rescore_clientes_csv(input_path=CLIENTES_FILE, output_path=None, chunksize=100_000):
+    """Recalcula score e limite de todos os clientes lendo o CSV em blocos.
+
+    O limite é reduzido ao máximo permitido pela nova faixa de score (nunca
+    aumentado sem solicitação). Escreve num arquivo temporário e o troca
+    atomicamente ao final; retorna o número de linhas processadas.
+    """
+    import pandas as pd
+    import numpy as np
+    output_path = output_path or input_path
+    tmp_path = output_path + '.tmp'
+    total = 0
+    header = True
+    # Mesma trava das atualizações por linha do CSVStorage: nenhuma escrita se perde durante a reescrita
+    with row_locks(output_path + '.lock').hold_all():
+        for chunk in pd.read_csv(input_path, dtype={'cpf': str}, chunksize=chunksize):
+            chunk = with_versao(chunk)
+            chunk['score'] = calculate_scores(chunk)
+            chunk['limite'] = np.minimum(chunk['limite'].to_numpy(dtype=float), get_max_limits_for_scores(chunk['score']))
+            chunk['versao'] += 1
+            chunk.to_csv(tmp_path, mode='w' if header else 'a', header=header, index=False)
+            header = False
+            total += len(chunk)
+        if header:
+            # CSV vazio: nada a reescrever
+            return 0
+        os.replace(tmp_path, output_path)
+    get_storage().invalidate()
+    return total
+
+def modify_cliente(cpf, change, retries=5):
+    """Lê, decide e grava um cliente sem perder atualizações concorrentes.
+
+    `change(user)` recebe a linha atual e retorna os campos a gravar (ou None
+    para não gravar nada). Tudo acontece sob a trava do CPF, e a gravação só
+    vale se a linha ainda estiver na versão lida; se outra escrita (fora da
+    trava, ex: o rescore) passar na frente, a leitura e a decisão são refeitas.
+    Retorna (cliente lido, campos gravados), ou (None, None) se o CPF não existir.
+    """
+    storage = get_storage()
+    with storage.lock_cliente(cpf):
+        for _ in range(retries):
+            user = storage.get_cliente(cpf)
+            if user is None:
+                return None, None
+            fields = change(user)
+            if not fields:
+                return user, None
+            try:
+                storage.update_cliente(cpf, expected_version=user['versao'], **fields)
+                return user, fields
+            except VersionConflict:
+                metrics.incr("storage.version_conflicts")
+    raise VersionConflict(cpf)
+
 def update_user_score(cpf, new_score):
-    df = load_clientes()
-    if cpf in df['cpf'].values:
-        df.loc[df['cpf'] == cpf, 'score'] = new_score
-        save_clientes(df)
-        return True
-    return False
+    storage = get_storage()
+    with storage.lock_cliente(cpf):
+        return storage.update_cliente(cpf, score=new_score)
+
+def save_interview(cpf, new_score, renda, tipo_emprego, dependentes, tem_dividas, despesas):
+    """Grava o novo score junto com as respostas da entrevista.
+
+    O rescore recalcula o score a partir dessas colunas; sem elas, a próxima
+    reavaliação voltaria ao score anterior à entrevista.
+    """
+    storage = get_storage()
+    with storage.lock_cliente(cpf):
+        return storage.update_cliente(
+            cpf, score=new_score, renda_mensal=renda, tipo_emprego=tipo_emprego,
+            despesas=despesas, dependentes=dependentes, tem_dividas=tem_dividas,
+        )
+
+def update_user_limit(cpf, new_limit):
+    storage = get_storage()
+    with storage.lock_cliente(cpf):
+        return storage.update_cliente(cpf, limite=new_limit)
+